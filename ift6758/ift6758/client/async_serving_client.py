@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .serving_client import OUTPUTS, ServingClient
+
+logger = logging.getLogger(__name__)
+
+
+class ShardResult(NamedTuple):
+    """Outcome of one shard: rows X.iloc[start:stop], their outputs or the error that lost them."""
+    shard: int
+    start: int
+    stop: int
+    frame: Optional[pd.DataFrame]
+    error: Optional[str]
+
+
+class AsyncServingClient:
+    """
+    Scores large DataFrames by splitting them into shards of shard_rows rows sent
+    concurrently to /predict, at most max_in_flight at a time (which also bounds the
+    memory held by encoded shards). Each shard is encoded once (columnar frames by
+    default, or DataFrame.to_json()) on a worker thread and sent on the pooled,
+    retrying transport of ServingClient, so the event loop stays free.
+
+        async with AsyncServingClient(features=["distance_from_net", "shot_angle"]) as client:
+            df = await client.predict(X, on_progress=print)
+
+    predict() returns X with the outputs joined in index order; predict_shards()
+    yields each ShardResult as it completes for callers that consume results
+    incrementally. A failed shard does not cancel the others.
+    """
+
+    def __init__(self, ip: str = "0.0.0.0", port: int = 8000, features=None, use_columnar: bool = True,
+                 shard_rows: int = 50000, max_in_flight: int = 4, priority: str = "bulk", **transport):
+        self.shard_rows = shard_rows
+        self.max_in_flight = max_in_flight
+        self.client = ServingClient(ip, port, features, use_columnar, priority=priority,
+                                    pool_size=max_in_flight, **transport)
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="serving-shard")
+
+
+    async def predict_shards(self, X: pd.DataFrame, model: str = None,
+                             version: str = None) -> AsyncIterator[ShardResult]:
+        """Yield the ShardResult of every shard of X, in completion order."""
+        features = self.client._feature_list()
+        params = self.client._model_params(model, version)
+        loop = asyncio.get_running_loop()
+        bounds = [(start, min(start + self.shard_rows, len(X))) for start in range(0, len(X), self.shard_rows)]
+
+        def submit(shard):
+            start, stop = bounds[shard]
+            X_model = X.iloc[start:stop][features]
+            return loop.run_in_executor(self._executor, self.client._score, X_model, params)
+
+        pending = {}
+        next_shard = 0
+        while next_shard < len(bounds) or pending:
+            while next_shard < len(bounds) and len(pending) < self.max_in_flight:
+                pending[submit(next_shard)] = next_shard
+                next_shard += 1
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                shard = pending.pop(future)
+                start, stop = bounds[shard]
+                try:
+                    yield ShardResult(shard, start, stop, future.result()[0], None)
+                except Exception as e:
+                    yield ShardResult(shard, start, stop, None, str(e))
+
+
+    async def predict(self, X: pd.DataFrame, model: str = None, version: str = None,
+                      on_progress: Callable[[ShardResult, int, int], None] = None) -> pd.DataFrame:
+        """
+        Scores X shard by shard and returns it with the outputs joined on, in X's order.
+
+        Args:
+            X (Dataframe): Input dataframe with the client's features.
+            model (str): Optional resident model to use instead of the server's default one
+            version (str): Version of that model (server default if omitted)
+            on_progress: Called after each shard with (shard result, rows done, total rows);
+                the rows of failed shards are counted as done and left NaN in the output.
+        """
+        outputs = {name: np.full(len(X), np.nan) for name in OUTPUTS}
+        rows_done = 0
+        failed = []
+        async for result in self.predict_shards(X, model, version):
+            rows_done += result.stop - result.start
+            if result.error is None:
+                for name in OUTPUTS:
+                    outputs[name][result.start:result.stop] = result.frame[name].to_numpy()
+            else:
+                failed.append(result)
+                logger.error(f"Shard {result.shard} (rows {result.start}-{result.stop}) failed: {result.error}")
+            if on_progress is not None:
+                on_progress(result, rows_done, len(X))
+
+        df_app = pd.DataFrame(outputs, index=X.index)
+        # without failed shards every row has a prediction
+        df_app["prediction"] = df_app["prediction"].astype(int if not failed else "Int64")
+        logger.info(f"Predictions received for {len(X) - sum(r.stop - r.start for r in failed)} of {len(X)} rows")
+        return ServingClient._join(X, df_app)
+
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -0,0 +1,117 @@
+"""
+Columnar binary wire format shared with the serving app (serving/columnar.py).
+
+Layout (all integers little-endian):
+
+    magic    4 bytes   b"XGC1"
+    n_rows   uint32
+    n_cols   uint16
+    names    n_cols x (uint16 length + utf-8 bytes)
+    padding  zero bytes up to the next 8-byte boundary
+    data     n_cols x n_rows float64, one contiguous block per column
+
+A stream is several of these frames back to back (see read_frames).
+The two copies must stay byte-compatible; neither side imports the other so
+the client and the serving app can be deployed independently.
+"""
+
+from __future__ import annotations
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, Mapping, Optional
+
+import numpy as np
+
+CONTENT_TYPE = "application/x-xg-columns"
+MAGIC = b"XGC1"
+_HEADER = struct.Struct("<4sIH")
+_NAME_LEN = struct.Struct("<H")
+_DTYPE = np.dtype("<f8")
+
+
+def _pad(n: int) -> int:
+    return (-n) % _DTYPE.itemsize
+
+
+def encode_columns(columns: Mapping[str, Iterable[float]]) -> bytes:
+    arrays = [np.ascontiguousarray(v, dtype=_DTYPE).reshape(-1) for v in columns.values()]
+    n_rows = len(arrays[0]) if arrays else 0
+    if any(len(a) != n_rows for a in arrays):
+        raise ValueError("All columns must have the same length")
+
+    parts = [_HEADER.pack(MAGIC, n_rows, len(arrays))]
+    for name in columns:
+        raw = str(name).encode("utf-8")
+        parts.append(_NAME_LEN.pack(len(raw)))
+        parts.append(raw)
+    size = sum(len(p) for p in parts)
+    parts.append(b"\x00" * _pad(size))
+    parts.extend(a.tobytes() for a in arrays)
+    return b"".join(parts)
+
+
+def decode_columns(buf: bytes) -> Dict[str, np.ndarray]:
+    if len(buf) < _HEADER.size:
+        raise ValueError("Payload too short for columnar header")
+    magic, n_rows, n_cols = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"Bad magic {magic!r}, expected {MAGIC!r}")
+
+    offset = _HEADER.size
+    names = []
+    for _ in range(n_cols):
+        (length,) = _NAME_LEN.unpack_from(buf, offset)
+        offset += _NAME_LEN.size
+        names.append(bytes(buf[offset:offset + length]).decode("utf-8"))
+        offset += length
+    offset += _pad(offset)
+
+    expected = offset + n_rows * n_cols * _DTYPE.itemsize
+    if len(buf) != expected:
+        raise ValueError(f"Payload is {len(buf)} bytes, header describes {expected}")
+
+    block = np.frombuffer(buf, dtype=_DTYPE, count=n_rows * n_cols, offset=offset)
+    block = block.reshape(n_cols, n_rows)
+    return {name: block[i] for i, name in enumerate(names)}
+
+
+def _read_exact(stream: BinaryIO, n: int, eof_ok: bool = False) -> bytes:
+    """Read exactly n bytes; b"" at a clean end of stream when eof_ok."""
+    parts = []
+    remaining = n
+    while remaining > 0:
+        part = stream.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    data = b"".join(parts)
+    if remaining and not (eof_ok and not data):
+        raise ValueError(f"Columnar stream truncated: expected {n} bytes, got {len(data)}")
+    return data
+
+
+def read_frames(stream: BinaryIO, max_rows: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Decode consecutive frames from a file-like object until it is exhausted,
+    holding one frame in memory at a time. Frames announcing more than
+    max_rows rows are rejected before their data is read.
+    """
+    while True:
+        header = _read_exact(stream, _HEADER.size, eof_ok=True)
+        if not header:
+            return
+        magic, n_rows, n_cols = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Bad magic {magic!r}, expected {MAGIC!r}")
+        if max_rows is not None and n_rows > max_rows:
+            raise ValueError(f"Frame of {n_rows} rows is larger than the {max_rows} rows allowed")
+
+        parts = [header]
+        for _ in range(n_cols):
+            raw_len = _read_exact(stream, _NAME_LEN.size)
+            parts.append(raw_len)
+            parts.append(_read_exact(stream, _NAME_LEN.unpack(raw_len)[0]))
+        size = sum(len(p) for p in parts)
+        parts.append(_read_exact(stream, _pad(size)))
+        parts.append(_read_exact(stream, n_rows * n_cols * _DTYPE.itemsize))
+        yield decode_columns(b"".join(parts))
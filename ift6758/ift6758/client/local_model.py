@@ -0,0 +1,102 @@
+"""
+In-process scoring from the serving app's artifact cache.
+
+Reads a model from the `<artifact_dir>/<model>:<version>/` layout used by
+serving/app.py and scores it the way the server does, so that
+ServingClient.predict can skip HTTP and JSON for batch jobs running next
+to the artifacts:
+
+    <model>.linear.json   portable coefficients (serving/portable.py), NumPy only
+    <model>.joblib        any other model, through scikit-learn
+
+The portable format and the linear scoring (float32, same sigmoid and
+threshold) mirror serving/portable.py and serving/kernels.py; as for
+columnar.py, the copies must stay compatible but neither side imports the
+other, so the client and the serving app can be deployed independently.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT = "xg-linear/1"
+SUFFIX = ".linear.json"
+
+
+def content_hash(payload: Dict[str, Any]) -> str:
+    """sha256 of the artifact content (everything but the hash itself), in canonical JSON."""
+    content = {k: v for k, v in payload.items() if k != "hash"}
+    raw = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def linear_scorer(payload: Dict[str, Any]) -> Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+    """score(X) -> (proba_goal, prediction) of a portable artifact, as LinearKernel computes it."""
+    coef = np.ascontiguousarray(payload["coef"], dtype=np.float32)
+    intercept = np.float32(payload["intercept"])
+    classes = np.asarray(payload["classes"])
+    fill = None if payload["fill"] is None else np.ascontiguousarray(payload["fill"], dtype=np.float32)
+    threshold = payload["threshold"]
+    z_threshold = np.float32(np.log(threshold / (1.0 - threshold)))
+
+    def score(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if fill is not None:
+            missing = np.isnan(X)
+            if missing.any():
+                X = np.where(missing, fill, X)
+        z = X @ coef + intercept
+        e = np.exp(-np.abs(z))
+        proba = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e)).astype(np.float32)
+        return proba, classes[(z > z_threshold).astype(np.intp)]
+
+    return score
+
+
+class LocalModel:
+    """A model of the artifact cache, scored in this process."""
+
+    def __init__(self, name: str, version: str, features: List[str],
+                 score: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]], artifact: str):
+        self.name = name
+        self.version = version
+        self.features = features
+        self.score = score
+        self.artifact = artifact
+
+    @classmethod
+    def load(cls, artifact_dir: str, name: str, version: str, features: Optional[List[str]] = None) -> "LocalModel":
+        """
+        Load <name>:<version> from artifact_dir. Raises FileNotFoundError / ValueError.
+        features is only used for joblib models that do not carry feature_names_in_
+        (ServingClient.use_local_model passes the server's feature list).
+        """
+        folder = os.path.join(artifact_dir, f"{name}:{version}")
+        portable_path = os.path.join(folder, f"{name}{SUFFIX}")
+        if os.path.exists(portable_path):
+            with open(portable_path, "r") as f:
+                payload = json.load(f)
+            if payload.get("format") != FORMAT:
+                raise ValueError(f"{portable_path}: unknown format {payload.get('format')!r}, expected {FORMAT!r}")
+            if payload.get("hash") != content_hash(payload):
+                raise ValueError(f"{portable_path}: content does not match its hash")
+            return cls(name, version, list(payload["features"]), linear_scorer(payload), portable_path)
+
+        joblib_path = os.path.join(folder, f"{name}.joblib")
+        if not os.path.exists(joblib_path):
+            raise FileNotFoundError(f"No artifact for {name}:{version} in {folder}")
+        import joblib
+        model = joblib.load(joblib_path)
+        names = getattr(model, "feature_names_in_", None)
+        features = [str(n) for n in names] if names is not None else features
+        if not features:
+            raise ValueError(f"No feature list known for model {name}")
+        def score(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # as SklearnKernel: the classes come from predict(), whatever the estimator's threshold
+            return model.predict_proba(X)[:, 1], model.predict(X)
+
+        return cls(name, version, features, score, joblib_path)
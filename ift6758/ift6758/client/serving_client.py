@@ -1,7 +1,19 @@
+import gzip
 import json
+import random
+import threading
+import time
+import zlib
+import http.client
+from collections import OrderedDict
+from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 import logging
+from . import columnar
+from .local_model import LocalModel
 
 input_feature_1="distance_from_net"
 input_feature_2="shot_angle"
@@ -12,25 +24,75 @@ DEFAULT_PROJECT="milestone_2"
 DEFAULT_MODEL="lr-angle"
 DEFAULT_VERSION="v1"
 
+# raw event fields expected by /predict_events
+EVENT_COLUMNS = ["x_coord", "y_coord", "period", "home", "situation_code"]
+
+# outputs of /predict, in the order of the legacy response
+OUTPUTS = ["prediction", "proba_non_goal", "proba_goal"]
+
+# responses worth retrying: shed by admission control (with Retry-After) or a proxy/restart hiccup
+RETRY_STATUSES = (429, 502, 503, 504)
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
 
 class ServingClient:
-    def __init__(self, ip: str = "0.0.0.0", port: int = 8000, features=None):
+    def __init__(self, ip: str = "0.0.0.0", port: int = 8000, features=None, use_columnar: bool = False,
+                 priority: str = None, pool_size: int = 10, timeout=(3.05, 60), retries: int = 3,
+                 backoff: float = 0.2, compress_min_bytes: int = None, dedup: bool = False,
+                 cache_size: int = 0):
+        """
+        Args (predict):
+            dedup (bool): Send each distinct feature row once and scatter the results back
+                (shot features repeat a lot: coordinates are integers)
+            cache_size (int): Keep the results of up to this many recent feature rows and only
+                send the others (implies dedup; 0: no cache)
+
+        Args (transport):
+            pool_size (int): Keep-alive connections kept open to the server (one per concurrent caller)
+            timeout: Seconds to connect and to wait for a response, a (connect, read) tuple or one number
+            retries (int): Retries of idempotent calls (predictions, reads) after a connection error,
+                a timeout or a 429/502/503/504, with jittered exponential backoff from `backoff` seconds
+            compress_min_bytes (int): gzip request bodies of at least this size (None: never)
+        """
+        self.ip = ip
+        self.port = port
         self.base_url = f"http://{ip}:{port}"
         logger.info(f"Initializing client; base URL: {self.base_url}")
 
+        # one pooled session: every call reuses a keep-alive connection instead of a new TCP handshake
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.compress_min_bytes = compress_min_bytes
+
         if features is None:
             features = input_feature_1
         self.features = features
+        # send/receive the binary columnar format instead of JSON
+        self.use_columnar = use_columnar
+        # X-Priority of the prediction requests for the server's admission control:
+        # "live" (dashboards, never shed), "bulk" (backfills, shed first) or None (normal)
+        self.priority = priority
+
+        self.dedup = dedup or cache_size > 0
+        self.cache_size = cache_size
+        # (served model, version, feature values) -> (prediction, proba_non_goal, proba_goal), least recent first
+        self._cache = OrderedDict()
+        # model scored in this process instead of by the server (see use_local_model)
+        self.local = None
 
         # any other potential initialization
            
 
 
-    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+    def predict(self, X: pd.DataFrame, model: str = None, version: str = None) -> pd.DataFrame:
         """
         Formats the inputs into an appropriate payload for a POST request, and queries the
         prediction service. Retrieves the response from the server, and processes it back into a
@@ -38,14 +100,28 @@ class ServingClient:
         
         Args:
             X (Dataframe): Input dataframe to submit to the prediction service.
+            model (str): Optional resident model to use instead of the server's default one
+            version (str): Version of that model (server default if omitted)
         """ 
         df_empty = pd.DataFrame()       
 
-        X_model = X[self.features].copy()
+        if self.local is not None and model in (None, self.local.name) and version in (None, self.local.version):
+            return self._predict_local(X)
+
+        params = self._model_params(model, version)
+
+        if self.dedup:
+            return self._predict_dedup(X, params)
+
+        X_model = X[self._feature_list()]
         logger.info(f"Senting Data with {self.features} to app")
 
+        if self.use_columnar:
+            return self._predict_columnar(X, X_model, params)
+
         try:
-            r = requests.post(f"{self.base_url}/predict", json=json.loads(X_model.to_json()) )
+            r = self._request("POST", "/predict", data=self._json_body(X_model), params=params,
+                              headers=self._headers({"Content-Type": "application/json"}))
         except Exception as e:
             logger.error(f"Failed to connect to app. {e}")
             return df_empty 
@@ -73,10 +149,491 @@ class ServingClient:
         return X.join(df_app)
 
 
+    def use_local_model(self, model: str = None, version: str = None, artifact_dir: str = "./artifacts",
+                        verify: bool = True) -> dict:
+        """
+        Score predict() calls in this process from the serving app's artifact cache
+        (<artifact_dir>/<model>:<version>/, see local_model.py) instead of over HTTP.
+        The output frame is the same as the server's.
+
+        Args:
+            model (str): Model to load; the server's default model if omitted
+            version (str): Version of that model (the server's default one's if omitted, else "v1")
+            artifact_dir (str): Artifact cache, e.g. ./artifacts from the repository root
+            verify (bool): Check that the server serves this model version with the same
+                features, so both give the same results (needs the server once)
+
+        Returns a description of the local model. Raises ValueError if the server does not
+        serve it, or if the artifact is missing or invalid. Calls with another model still
+        go to the server; set client.local = None to stop using it.
+        """
+        if model is None or verify:
+            served = self._request("GET", "/models").json()
+        if model is None:
+            default = served.get("default")
+            if default is None:
+                raise ValueError("The server has no default model")
+            model, version = default["model"], default["version"]
+        version = version or DEFAULT_VERSION
+
+        server_features = None
+        if verify:
+            entries = [m for m in served.get("models", []) if (m["model"], m["version"]) == (model, version)]
+            if not entries:
+                raise ValueError(f"The server does not serve {model}:{version}, local results could differ")
+            server_features = entries[0].get("features")
+
+        try:
+            # a joblib model without feature names is scored with the server's feature list (or the client's)
+            local = LocalModel.load(artifact_dir, model, version, server_features or self._feature_list())
+        except FileNotFoundError as e:
+            raise ValueError(str(e))
+        if server_features not in (None, local.features):
+            raise ValueError(f"The server scores {model}:{version} with {server_features}, "
+                             f"the local artifact with {local.features}")
+
+        self.local = local
+        logger.info(f"Scoring {model}:{version} locally from {local.artifact}")
+        return {"model": model, "version": version, "features": local.features, "artifact": local.artifact}
+
+
+    def _predict_local(self, X: pd.DataFrame) -> pd.DataFrame:
+        """predict() with the local model: same output frame, no HTTP."""
+        missing = [f for f in self.local.features if f not in X.columns]
+        if missing:
+            logger.error(f"Missing required features: {missing}")
+            return pd.DataFrame()
+        p_goal, y_pred = self.local.score(X[self.local.features].to_numpy(dtype=float))
+        # 1 - p in the kernel's precision, as the server computes it
+        df_app = pd.DataFrame({
+            "prediction": y_pred.astype(int),
+            "proba_non_goal": (1.0 - p_goal).astype(float),
+            "proba_goal": p_goal.astype(float),
+        }, index=X.index)
+        return X.join(df_app)
+
+
+    def _feature_list(self) -> list:
+        return [self.features] if isinstance(self.features, str) else list(self.features)
+
+
+    def _predict_dedup(self, X: pd.DataFrame, params: dict) -> pd.DataFrame:
+        """predict() sending only the distinct feature rows that are not in the cache."""
+        features = self._feature_list()
+        X_model = X[features]
+        # codes[i]: distinct row of X_model[i], numbered in order of first appearance like drop_duplicates
+        codes = X_model.groupby(features, dropna=False, sort=False).ngroup().to_numpy()
+        uniques = X_model.drop_duplicates()
+
+        try:
+            served = self._served_model(params)
+        except Exception as e:
+            logger.error(f"Could not get the served model: {e}")
+            return pd.DataFrame()
+
+        outputs = np.empty((len(uniques), len(OUTPUTS)))
+        rows = list(uniques.itertuples(index=False, name=None))
+        missing = []
+        for i, row in enumerate(rows):
+            cached = self._cache.get((*served, *row))
+            if cached is None:
+                missing.append(i)
+            else:
+                self._cache.move_to_end((*served, *row))
+                outputs[i] = cached
+        logger.info(f"Sending {len(missing)} distinct rows of {len(X_model)} "
+                    f"({len(uniques) - len(missing)} from the cache of {served[0]}:{served[1]})")
+
+        if missing:
+            try:
+                df_app, scored_by = self._score(uniques.iloc[missing], params)
+                if scored_by != served:
+                    # the default model was swapped since _served_model(): the cached rows are stale
+                    logger.info(f"Server model changed to {scored_by[0]}:{scored_by[1]}, scoring every row")
+                    df_app, served = self._score(uniques, params)
+                    missing = list(range(len(uniques)))
+            except Exception as e:
+                logger.error(f"Prediction failed: {e}")
+                return pd.DataFrame()
+            scored = df_app[OUTPUTS].to_numpy(dtype=float)
+            outputs[missing] = scored
+            if self.cache_size:
+                for i, values in zip(missing, scored):
+                    self._cache[(*served, *rows[i])] = values
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        df_app = pd.DataFrame(outputs[codes], columns=OUTPUTS, index=X.index)
+        df_app["prediction"] = df_app["prediction"].astype(int)
+        return X.join(df_app)
+
+
+    def _served_model(self, params: dict) -> tuple:
+        """
+        (model, version) that scores a request with params. A named model always resolves
+        to the same one; the default model can be swapped at any time, so it is asked from
+        /models on every call (a cheap GET, even when every row is then served from the cache).
+        """
+        if "model" in params:
+            return params["model"], params.get("version", DEFAULT_VERSION)
+        default = self._request("GET", "/models").json().get("default")
+        if default is None:
+            raise RuntimeError("The server has no default model")
+        return default["model"], default["version"]
+
+
+    def _score(self, X_model: pd.DataFrame, params: dict):
+        """
+        Send X_model to /predict and return (its OUTPUTS as a frame on X_model's index,
+        (model, version) that scored it). Raises on any error.
+        """
+        params = {**params, "outputs": ",".join(OUTPUTS)}
+        if self.use_columnar:
+            payload = columnar.encode_columns({c: X_model[c].to_numpy(dtype=float) for c in X_model.columns})
+            headers = {"Content-Type": columnar.CONTENT_TYPE, "Accept": columnar.CONTENT_TYPE}
+        else:
+            payload = self._json_body(X_model)
+            headers = {"Content-Type": "application/json"}
+        r = self._request("POST", "/predict", data=payload, params=params, headers=self._headers(headers))
+
+        if r.headers.get("Content-Type", "").split(";")[0] == columnar.CONTENT_TYPE:
+            columns = columnar.decode_columns(r.content)
+            served = (r.headers.get("X-Model-Name"), r.headers.get("X-Model-Version"))
+        else:
+            response = r.json()
+            if "error" in response or r.status_code != 200:
+                raise RuntimeError(response.get("error", f"HTTP {r.status_code}"))
+            columns = {name: response[name] for name in OUTPUTS}
+            served = (response.get("model_name"), response.get("model_version"))
+        df_app = pd.DataFrame(columns, index=X_model.index)
+        df_app["prediction"] = df_app["prediction"].astype(int)
+        return df_app, served
+
+
+    def predict_events(self, events: pd.DataFrame, model: str = None, version: str = None) -> pd.DataFrame:
+        """
+        Scores raw shot events: sends the EVENT_COLUMNS fields to /predict_events, where the
+        server derives distance_from_net, shot_angle and empty_net and scores them in the
+        same pass (no FeatureEngineering needed on the client).
+
+        Args:
+            events (Dataframe): Shot events with at least the EVENT_COLUMNS columns.
+            model (str): Optional resident model to use instead of the server's default one
+            version (str): Version of that model (server default if omitted)
+
+        Returns the events with the derived features and the predictions joined on.
+        """
+        df_empty = pd.DataFrame()
+        X_model = events[EVENT_COLUMNS]
+        params = self._model_params(model, version)
+
+        if self.use_columnar:
+            numeric = X_model.apply(lambda c: pd.to_numeric(c, errors="coerce"))
+            return self._predict_columnar(events, numeric, params, "/predict_events")
+
+        try:
+            r = self._request("POST", "/predict_events", data=self._json_body(X_model), params=params,
+                              headers=self._headers({"Content-Type": "application/json"}))
+        except Exception as e:
+            logger.error(f"Failed to connect to app. {e}")
+            return df_empty
+
+        try:
+            response = r.json()
+            features = response["features"]
+            y_pred = response["predictions"]
+            y_proba = response["probabilities"]
+        except Exception as e:
+            logger.error(f"incorect data received: {e}, {r.text[:500]}")
+            return df_empty
+
+        logger.info("Predictions received")
+        df_app = pd.DataFrame({
+            **features,
+            "prediction": y_pred,
+            "proba_non_goal": [p[0] for p in y_proba],
+            "proba_goal": [p[1] for p in y_proba]
+        }, index=X_model.index)
+
+        return self._join(events, df_app)
+
+
+    def _predict_columnar(self, X: pd.DataFrame, X_model, params: dict, endpoint: str = "/predict") -> pd.DataFrame:
+        """Same as predict(), but over the binary columnar format (see columnar.py)."""
+        if isinstance(X_model, pd.Series):
+            X_model = X_model.to_frame()
+        payload = columnar.encode_columns({c: X_model[c].to_numpy(dtype=float) for c in X_model.columns})
+        headers = self._headers({"Content-Type": columnar.CONTENT_TYPE, "Accept": columnar.CONTENT_TYPE})
+
+        try:
+            r = self._request("POST", endpoint, data=payload, headers=headers, params=params)
+        except Exception as e:
+            logger.error(f"Failed to connect to app. {e}")
+            return pd.DataFrame()
+
+        if r.headers.get("Content-Type", "").split(";")[0] != columnar.CONTENT_TYPE:
+            # the server answers errors in JSON
+            logger.error(f"incorect data received: {r.text}")
+            return pd.DataFrame()
+
+        try:
+            columns = columnar.decode_columns(r.content)
+        except Exception as e:
+            logger.error(f"Failed to parse columnar response: {e}")
+            return pd.DataFrame()
+
+        logger.info("Predictions received")
+        df_app = pd.DataFrame(columns, index=X_model.index)
+        for c in df_app.columns:
+            # "prediction:<model>:<version>" for /predict_ensemble
+            if c.split(":")[0] in ("prediction", "empty_net"):
+                df_app[c] = df_app[c].astype(int)
+
+        return self._join(X, df_app)
+
+
+    def predict_ensemble(self, X: pd.DataFrame, models: list, outputs: list = None) -> pd.DataFrame:
+        """
+        Scores the same shots with several resident models in one request (/predict_ensemble),
+        e.g. models=["lr-angle", "lr-distance", "lr-both:v1"] to compare them in the dashboard.
+        The client's features must cover the features of every model.
+
+        Returns X with one "<output>:<model>:<version>" column per model and output
+        (outputs default to ["proba_goal"]).
+        """
+        X_model = X[self._feature_list()]
+        params = {"models": ",".join(models)}
+        if outputs:
+            params["outputs"] = ",".join(outputs)
+
+        if self.use_columnar:
+            return self._predict_columnar(X, X_model, params, "/predict_ensemble")
+
+        try:
+            r = self._request("POST", "/predict_ensemble", data=self._json_body(X_model), params=params,
+                              headers=self._headers({"Content-Type": "application/json"}))
+            response = r.json()
+            labels = response["models"]
+        except Exception as e:
+            logger.error(f"incorect data received: {e}")
+            return pd.DataFrame()
+
+        logger.info("Predictions received")
+        df_app = pd.DataFrame({
+            f"{output}:{label}": response[output][label]
+            for output in (outputs or ["proba_goal"]) for label in labels
+        }, index=X_model.index)
+
+        return self._join(X, df_app)
+
+
+    def predict_stream(self, X: pd.DataFrame, chunk_rows: int = 10000, model: str = None, version: str = None):
+        """
+        Scores a dataset of any size through /predict_stream, chunk_rows rows at a time.
+
+        Generator: yields each chunk of X joined with its predictions as soon as the
+        server returns it, so neither side ever holds the whole dataset in memory,
+        e.g. pd.concat(client.predict_stream(master_df)) or write each chunk to disk.
+        The upload runs in a background thread while the results are read, since the
+        server answers chunk by chunk before the request body is complete. The client's
+        timeout applies to the connection and to every read and write (a stalled server
+        ends the stream with an error), the upload is gzip-compressed when
+        compress_min_bytes is set, and the stream is not retried: chunks already yielded
+        would be scored again.
+
+        Args:
+            X (Dataframe): Input dataframe with the client's features.
+            chunk_rows (int): Rows per uploaded chunk.
+            model (str): Optional resident model to use instead of the server's default one
+            version (str): Version of that model (server default if omitted)
+        """
+        features = self._feature_list()
+        X_model = X[features]
+        query = urlencode(self._model_params(model, version))
+        content_type = columnar.CONTENT_TYPE if self.use_columnar else "application/x-ndjson"
+
+        def chunks():
+            for start in range(0, len(X_model), chunk_rows):
+                part = X_model.iloc[start:start + chunk_rows]
+                if self.use_columnar:
+                    yield columnar.encode_columns({c: part[c].to_numpy(dtype=float) for c in features})
+                else:
+                    yield part.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+
+        connect_timeout, read_timeout = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        compress = self.compress_min_bytes is not None
+
+        def bodies():
+            if not compress:
+                yield from chunks()
+                return
+            deflater = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for body in chunks():
+                # sync flush: the server can inflate and score each chunk as it arrives
+                yield deflater.compress(body) + deflater.flush(zlib.Z_SYNC_FLUSH)
+            yield deflater.flush()
+
+        conn = http.client.HTTPConnection(self.ip, self.port, timeout=connect_timeout)
+        try:
+            conn.connect()
+            conn.sock.settimeout(read_timeout)
+            conn.putrequest("POST", "/predict_stream" + (f"?{query}" if query else ""))
+            conn.putheader("Content-Type", content_type)
+            conn.putheader("Accept", content_type)
+            conn.putheader("Transfer-Encoding", "chunked")
+            if compress:
+                conn.putheader("Content-Encoding", "gzip")
+            for name, value in self._headers().items():
+                conn.putheader(name, value)
+            conn.endheaders()
+        except Exception as e:
+            logger.error(f"Failed to connect to app. {e}")
+            conn.close()
+            return
+        # getresponse() may detach the socket from conn (Connection: close), and
+        # conn.send() would then open a new connection: write to the socket itself
+        sock = conn.sock
+
+        def upload():
+            try:
+                for body in bodies():
+                    if not body:
+                        continue  # an empty chunk would end the chunked body
+                    sock.sendall(f"{len(body):X}\r\n".encode() + body + b"\r\n")
+                sock.sendall(b"0\r\n\r\n")
+            except Exception as e:
+                # the server stops reading when it rejects the request
+                logger.warning(f"Upload stopped: {e}")
+
+        uploader = threading.Thread(target=upload, daemon=True)
+        uploader.start()
+        try:
+            r = conn.getresponse()
+            if r.getheader("Content-Type", "").split(";")[0] != content_type:
+                logger.error(f"incorect data received: {r.read()[:500]}")
+                return
+
+            offset = 0
+            if self.use_columnar:
+                results = columnar.read_frames(r)
+            else:
+                results = (json.loads(line) for line in r if line.strip())
+            for result in results:
+                if "error" in result:
+                    logger.error(f"Stream failed: {result['error']}")
+                    return
+                if "done" in result:
+                    logger.info(f"Predictions received for {result['n_samples']} rows")
+                    continue
+                result.pop("offset", None)
+                result.pop("n_samples", None)
+                n = len(next(iter(result.values())))
+                df_app = pd.DataFrame(result, index=X.index[offset:offset + n])
+                if "prediction" in df_app:
+                    df_app["prediction"] = df_app["prediction"].astype(int)
+                yield self._join(X.iloc[offset:offset + n], df_app)
+                offset += n
+
+            if offset != len(X):
+                logger.error(f"Stream ended after {offset} of {len(X)} rows")
+        except Exception as e:
+            logger.error(f"Failed to read the prediction stream: {e}")
+        finally:
+            conn.close()
+            sock.close()
+            uploader.join(timeout=1)
+
+
+    def _request(self, method: str, path: str, idempotent: bool = True, data: bytes = None,
+                 json_body=None, headers: dict = None, **kwargs) -> requests.Response:
+        """
+        Send a request on the pooled session, gzip-compressing large bodies, and retry
+        idempotent ones (see __init__). Raises the last error when every attempt failed.
+        """
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        if data is not None and self.compress_min_bytes is not None and len(data) >= self.compress_min_bytes:
+            # level 1: most of the size gain for a fraction of the CPU
+            data = gzip.compress(data, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            try:
+                r = self.session.request(method, f"{self.base_url}{path}", data=data, headers=headers,
+                                         timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == attempts - 1:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"{method} {path} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                if r.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return r
+                delay = self._backoff_delay(attempt)
+                try:
+                    delay = max(delay, float(r.headers.get("Retry-After", 0)))
+                except ValueError:
+                    pass
+                logger.warning(f"{method} {path} answered {r.status_code}, retrying in {delay:.2f}s")
+                r.close()
+            time.sleep(delay)
+
+
+    def _backoff_delay(self, attempt: int, cap: float = 10.0) -> float:
+        # "full jitter": clients shed at the same time do not all come back at the same time
+        return random.uniform(0, min(cap, self.backoff * 2 ** attempt))
+
+
+    @staticmethod
+    def _json_body(X_model) -> bytes:
+        # serialized once by pandas (no json.loads / json.dumps round trip)
+        return X_model.to_json().encode("utf-8")
+
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    @staticmethod
+    def _join(X: pd.DataFrame, df_app: pd.DataFrame) -> pd.DataFrame:
+        """Join the server's columns onto X, replacing columns X already has."""
+        overlap = [c for c in df_app.columns if c in X.columns]
+        return X.drop(columns=overlap).join(df_app)
+
+
+    def _headers(self, headers: dict = None) -> dict:
+        headers = dict(headers or {})
+        if self.priority:
+            headers["X-Priority"] = self.priority
+        return headers
+
+
+    @staticmethod
+    def _model_params(model: str = None, version: str = None) -> dict:
+        params = {}
+        if model:
+            params["model"] = model
+        if version:
+            params["version"] = version
+        return params
+
+
     def logs(self) -> dict:
         """Get server logs"""
         try:
-            res = requests.get(f"{self.base_url}/logs")
+            res = self._request("GET", "/logs")
         except Exception as e:
             log_message = f"Failed: {e}"
             logger.error(log_message)
@@ -86,7 +643,7 @@ class ServingClient:
 
 
 
-    def download_registry_model(self, workspace: str = "IFT6758_team4",model: str = "lr-distance",version: str = "v1",project: str = "milestone_2",) -> dict:
+    def download_registry_model(self, workspace: str = "IFT6758_team4",model: str = "lr-distance",version: str = "v1",project: str = "milestone_2", wait: bool = False) -> dict:
         """
         Triggers a "model swap" in the service; the workspace, model, and model version are
         specified and the service looks for this model in the model registry and tries to
@@ -98,20 +655,26 @@ class ServingClient:
     
 
 
+        The swap runs in the background on the server; poll download_status()
+        to follow it, or pass wait=True to block until it is done.
+
         Args:
             workspace (str): The Comet ML workspace
             model (str): The model in the Comet ML registry to download
             version (str): The model version to download
+            wait (bool): Wait for the swap to finish before returning
         """
 
         payload = {
             "workspace": workspace,
             "project": project,
             "model": model,
-            "version": version
+            "version": version,
+            "wait": wait,
             }
         try:
-            res = requests.post(f"{self.base_url}/download_registry_model", json=payload)
+            # not retried: a swap is expensive and a lost response does not mean it did not start
+            res = self._request("POST", "/download_registry_model", json_body=payload, idempotent=False)
         except Exception as e:
             log_message=f'Request to choose model {model}, version {version} failed'
             logger.error(log_message)
@@ -121,6 +684,83 @@ class ServingClient:
         logger.info(log_message)
         return (res.json())
 
+
+    def download_status(self) -> dict:
+        """Get the progress of model swaps on the server"""
+        try:
+            res = self._request("GET", "/download_status")
+        except Exception as e:
+            log_message = f"Failed: {e}"
+            logger.error(log_message)
+            return {"error": log_message}
+
+        return res.json()
+
+
+    def submit_job(self, input_path: str, model: str = None, version: str = None, outputs: list = None) -> dict:
+        """
+        Queues an asynchronous bulk scoring job on the server and returns its status
+        (with its job_id) right away.
+
+        Args:
+            input_path (str): CSV or Parquet file on the server, relative to its job input directory
+            model (str): Model to score with (the server's default one if omitted)
+            version (str): Version of that model
+            outputs (list): Outputs to keep, e.g. ["proba_goal"] (all of them if omitted)
+        """
+        payload = {"input": input_path, **self._model_params(model, version)}
+        if outputs:
+            payload["outputs"] = list(outputs)
+        try:
+            # not retried: each submission queues a new job
+            res = self._request("POST", "/jobs", json_body=payload, idempotent=False)
+        except Exception as e:
+            log_message = f"Failed: {e}"
+            logger.error(log_message)
+            return {"error": log_message}
+
+        return res.json()
+
+
+    def job_status(self, job_id: str) -> dict:
+        """State and progress of a bulk scoring job"""
+        try:
+            res = self._request("GET", f"/jobs/{job_id}")
+        except Exception as e:
+            log_message = f"Failed: {e}"
+            logger.error(log_message)
+            return {"error": log_message}
+
+        return res.json()
+
+
+    def job_result(self, job_id: str) -> pd.DataFrame:
+        """
+        Results of a finished job: one row per input row ("row" is its position in
+        the input file) with the requested outputs. Empty if the job is not done.
+        """
+        headers = {"Accept": columnar.CONTENT_TYPE} if self.use_columnar else {}
+        try:
+            res = self._request("GET", f"/jobs/{job_id}/result", headers=headers, stream=True)
+        except Exception as e:
+            logger.error(f"Failed to connect to app. {e}")
+            return pd.DataFrame()
+
+        res.raw.decode_content = True
+        content_type = res.headers.get("Content-Type", "").split(";")[0]
+        if content_type == columnar.CONTENT_TYPE:
+            parts = [pd.DataFrame(columns) for columns in columnar.read_frames(res.raw)]
+            df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+            for c in ("row", "prediction"):
+                if c in df:
+                    df[c] = df[c].astype(int)
+            return df
+        if content_type == "text/csv":
+            return pd.read_csv(res.raw)
+
+        logger.error(f"incorect data received: {res.text[:500]}")
+        return pd.DataFrame()
+
 #PATH="./ift6758/data/nhl/csv/processed/test_sample.csv"
 #df=pd.read_csv(PATH)
 #df_out = client.predict(df)
@@ -0,0 +1,129 @@
+"""
+Compare the two serving modes under concurrent /predict load:
+
+    wsgi  gunicorn -c gunicorn.conf.py app:app   (sync workers, see gunicorn.conf.py)
+    asgi  uvicorn asgi:app                       (async handlers, see asgi.py)
+
+Both servers are started locally from ./serving on their own port, then each
+concurrency level sends `--requests` requests of `--rows` shots per client
+thread (one keep-alive session per client) and reports throughput, latency
+percentiles and errors.
+
+Run from the repository root:
+
+    $ python scripts/step2_app/benchmark_asgi.py --concurrency 1 16 64 256 --rows 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+SERVING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "serving")
+
+MODES = {
+    "wsgi": lambda port: ["gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app"],
+    "asgi": lambda port: ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+}
+
+
+def start_server(mode, port, timeout=120):
+    proc = subprocess.Popen(MODES[mode](port), cwd=SERVING_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/models", timeout=1)
+            return proc
+        except requests.RequestException:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+def run_level(url, payload, concurrency, n_requests, headers=None):
+    """Latencies (seconds) of every request, error count and wall time for one concurrency level."""
+    headers = headers or {"Content-Type": "application/json"}
+
+    def client(_):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            for _ in range(n_requests):
+                start = time.perf_counter()
+                try:
+                    r = session.post(url, data=payload, headers=headers, timeout=60)
+                    # errors come back as JSON with a 200 (columnar responses have no "error")
+                    is_json = r.headers.get("Content-Type", "").startswith("application/json")
+                    if r.status_code != 200 or (is_json and "error" in r.json()):
+                        errors += 1
+                except requests.RequestException:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies = np.concatenate([np.asarray(l) for l, _ in results])
+    return latencies, sum(e for _, e in results), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--rows", type=int, default=10, help="shots per request")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    payload = json.dumps({
+        "distance_from_net": dict(enumerate(rng.uniform(0, 100, args.rows).round(2).tolist())),
+        "shot_angle": dict(enumerate(rng.uniform(0, 90, args.rows).round(2).tolist())),
+    })
+
+    results = []
+    for i, mode in enumerate(args.modes):
+        port = args.port + i
+        proc = start_server(mode, port)
+        try:
+            url = f"http://127.0.0.1:{port}/predict"
+            run_level(url, payload, 1, 5)  # warm-up
+            for concurrency in args.concurrency:
+                latencies, errors, wall = run_level(url, payload, concurrency, args.requests)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                results.append({
+                    "mode": mode,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "req_per_sec": len(latencies) / wall,
+                    "p50_ms": p50,
+                    "p95_ms": p95,
+                    "p99_ms": p99,
+                })
+                r = results[-1]
+                print(f"{mode:5s} c={concurrency:4d}  {r['req_per_sec']:8.1f} req/s  "
+                      f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  errors {errors}")
+                sys.stdout.flush()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Load test of /predict against a local server, with a stored baseline.
+
+The app is started from ./serving (gunicorn with gunicorn.conf.py, or
+uvicorn) on a bundled artifact, e.g. artifacts/lr-distance:v1: the default
+model pointer, audit log and job directory point to a temporary directory,
+so nothing is downloaded from W&B and the default model published by
+a local run is left alone.
+
+Every (batch size, concurrency) cell sends `--requests` requests per client
+thread and reports p50/p95/p99 latency, requests/s, rows/s, errors and the
+resident memory (RSS) of each server worker after the cell.
+
+Results are compared with a baseline file (same cells): a cell regresses
+when its p99 grows, or its rows/s drops, by more than --tolerance. The
+baseline is machine specific: it stores the CPU count and platform it was
+recorded on, and a baseline from another machine (or a missing one) is an
+error, not a comparison. load_test_baseline.json was recorded with the
+defaults on a 1-CPU Linux x86_64 container; elsewhere, record your own.
+Run from the repository root:
+
+    $ python scripts/step2_app/load_test.py --save-baseline
+    $ python scripts/step2_app/load_test.py              # exits with 1 on a regression, 2 without a usable baseline
+    $ python scripts/step2_app/load_test.py --rows 1 100 10000 --concurrency 1 8 32 --format columnar
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+from benchmark_asgi import MODES, SERVING_DIR, run_level
+
+sys.path.insert(0, SERVING_DIR)
+import columnar  # noqa: E402  (serving/columnar.py)
+
+ARTIFACT_DIR = os.path.join(SERVING_DIR, "..", "artifacts")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test_baseline.json")
+FEATURES = {"distance_from_net": (0, 100), "shot_angle": (0, 90)}
+# a baseline is only comparable on a machine with the same values
+MACHINE = {"cpu_count": os.cpu_count(), "platform": f"{sys.platform}-{platform.machine()}"}
+
+
+def start_server(mode, port, model, version, workers, tmp_dir, timeout=120):
+    """Start the app on a bundled artifact, without W&B; returns the server process."""
+    artifact = os.path.join(ARTIFACT_DIR, f"{model}:{version}")
+    if not os.path.isdir(artifact):
+        raise SystemExit(f"No bundled artifact {artifact}")
+    pointer = os.path.join(tmp_dir, "default_model.json")
+    with open(pointer, "w") as f:
+        # the pointer makes it the default model; the artifact is on disk, so there is no download
+        json.dump({"workspace": "local", "project": "local", "model": model, "version": version}, f)
+
+    env = {
+        **os.environ,
+        "SERVING_MODEL_POINTER": pointer,
+        "SERVING_AUDIT_DIR": os.path.join(tmp_dir, "audit"),
+        "SERVING_JOB_DIR": os.path.join(tmp_dir, "jobs"),
+        "SERVING_WORKERS": str(workers),
+        "WANDB_MODE": "disabled",
+    }
+    proc = subprocess.Popen(MODES[mode](port), cwd=SERVING_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            default = requests.get(f"http://127.0.0.1:{port}/models", timeout=1).json().get("default")
+            if default and (default["model"], default["version"]) == (model, version):
+                return proc
+            if default:
+                break
+        except (requests.RequestException, ValueError):
+            if proc.poll() is not None:
+                break
+        time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port} with {model}:{version}")
+
+
+def worker_rss_mb(pid):
+    """{pid: RSS in MB} of the server process and its children (Linux /proc), {} elsewhere."""
+    def rss(p):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            return None
+
+    def children(p):
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                return [int(c) for c in f.read().split()]
+        except OSError:
+            return []
+
+    # gunicorn: master + workers; uvicorn: a single process
+    result = {}
+    for p in children(pid) or [pid]:
+        r = rss(p)
+        if r is not None:
+            result[p] = r
+    return result
+
+
+def make_payload(rows, fmt, rng):
+    columns = {name: rng.uniform(lo, hi, rows).round(2) for name, (lo, hi) in FEATURES.items()}
+    if fmt == "columnar":
+        headers = {"Content-Type": columnar.CONTENT_TYPE, "Accept": columnar.CONTENT_TYPE}
+        return columnar.encode_columns(columns), headers
+    payload = json.dumps({name: dict(enumerate(v.tolist())) for name, v in columns.items()})
+    return payload, {"Content-Type": "application/json"}
+
+
+def load_baseline(path):
+    """The baseline at path; exits with 2 when it is missing or was recorded on another machine."""
+    if not os.path.exists(path):
+        # nothing to compare with is a failure, not a pass
+        print(f"ERROR: no baseline at {path} (record one with --save-baseline)", file=sys.stderr)
+        sys.exit(2)
+    with open(path) as f:
+        baseline = json.load(f)
+    differs = {k: baseline.get(k) for k, v in MACHINE.items() if baseline.get(k) != v}
+    if differs:
+        print(f"ERROR: {path} was recorded on another machine ({differs}, here {MACHINE}); "
+              "record one here with --save-baseline", file=sys.stderr)
+        sys.exit(2)
+    return baseline
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results vs the baseline, cell by cell (cells missing from either are skipped)."""
+    cells = {(b["rows"], b["concurrency"]): b for b in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = cells.get((r["rows"], r["concurrency"]))
+        if b is None:
+            continue
+        if r["p99_ms"] > b["p99_ms"] * (1 + tolerance):
+            regressions.append(f"rows={r['rows']} c={r['concurrency']}: p99 {r['p99_ms']:.1f} ms vs {b['p99_ms']:.1f} ms")
+        if r["rows_per_sec"] < b["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"rows={r['rows']} c={r['concurrency']}: "
+                               f"{r['rows_per_sec']:.0f} rows/s vs {b['rows_per_sec']:.0f} rows/s")
+        if r["errors"] > b["errors"]:
+            regressions.append(f"rows={r['rows']} c={r['concurrency']}: {r['errors']} errors vs {b['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="wsgi", choices=list(MODES))
+    parser.add_argument("--model", default="lr-distance")
+    parser.add_argument("--version", default="v1")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (SERVING_WORKERS)")
+    parser.add_argument("--rows", nargs="+", type=int, default=[1, 100, 10000], help="shots per request")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=50, help="requests per client and cell")
+    parser.add_argument("--format", default="json", choices=["json", "columnar"])
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p99 / rows/s change")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # checked before the run, which takes minutes
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+
+    rng = np.random.default_rng(0)
+    url = f"http://127.0.0.1:{args.port}/predict"
+    results = []
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp_dir:
+        proc = start_server(args.mode, args.port, args.model, args.version, args.workers, tmp_dir)
+        try:
+            for rows in args.rows:
+                payload, headers = make_payload(rows, args.format, rng)
+                run_level(url, payload, 1, 5, headers)  # warm-up
+                for concurrency in args.concurrency:
+                    latencies, errors, wall = run_level(url, payload, concurrency, args.requests, headers)
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                    rss = worker_rss_mb(proc.pid)
+                    results.append({
+                        "rows": rows,
+                        "concurrency": concurrency,
+                        "requests": len(latencies),
+                        "errors": errors,
+                        "req_per_sec": len(latencies) / wall,
+                        "rows_per_sec": len(latencies) * rows / wall,
+                        "p50_ms": p50,
+                        "p95_ms": p95,
+                        "p99_ms": p99,
+                        "worker_rss_mb": sorted(rss.values()),
+                    })
+                    r = results[-1]
+                    print(f"rows={rows:6d} c={concurrency:4d}  {r['req_per_sec']:8.1f} req/s  "
+                          f"{r['rows_per_sec']:10.0f} rows/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  "
+                          f"p99 {p99:7.1f} ms  errors {errors}  RSS/worker MB {[round(m) for m in r['worker_rss_mb']]}")
+                    sys.stdout.flush()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    report = {
+        "mode": args.mode,
+        "model": f"{args.model}:{args.version}",
+        "workers": args.workers,
+        "format": args.format,
+        "requests_per_client": args.requests,
+        **MACHINE,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    setup = ("mode", "model", "workers", "format")
+    if any(baseline.get(k) != report[k] for k in setup):
+        print("Warning: baseline recorded with " + ", ".join(f"{k}={baseline.get(k)}" for k in setup))
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) vs {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regression vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
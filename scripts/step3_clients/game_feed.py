@@ -0,0 +1,115 @@
+"""
+Cached access to the NHL play-by-play feed.
+
+One GET per refresh serves both the new events (poll_and_predict) and the
+scoreboard metadata (team names, logos, score, period, clock) of the
+dashboard. The last feed of each game is kept with its ETag / Last-Modified
+validators, so a refresh of an unchanged game is a conditional request
+answered by 304 Not Modified, without a body to download or parse.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import requests
+
+FEED_URL = "https://api-web.nhle.com/v1/gamecenter/{game_id}/play-by-play"
+
+
+# -------------------------------------------------------------
+# Extract plays (supports new NHL API)
+# -------------------------------------------------------------
+def extract_all_plays(game_json):
+
+    # NEW NHL API FORMAT
+    if "plays" in game_json and isinstance(game_json["plays"], list):
+        return game_json["plays"]
+
+    # OLD FORMAT
+    try:
+        return game_json["liveData"]["plays"]["allPlays"]
+    except:
+        return []
+
+
+# -------------------------------------------------------------
+# Scoreboard metadata
+# -------------------------------------------------------------
+def extract_metadata(game_json):
+    home, away = game_json["homeTeam"], game_json["awayTeam"]
+    return {
+        "teams": {"home": home["commonName"]["default"], "away": away["commonName"]["default"]},
+        "logos": {"home": home["logo"], "away": away["logo"]},
+        "score": {"home": home["score"], "away": away["score"]},
+        "period": game_json["periodDescriptor"]["number"],
+        "time_left": game_json["clock"]["timeRemaining"],
+    }
+
+
+class FeedUpdate(NamedTuple):
+    """A game feed: its JSON, plays and metadata; modified is False when the server answered 304."""
+    game_json: Dict[str, Any]
+    plays: List[Dict[str, Any]]
+    meta: Optional[Dict[str, Any]]
+    modified: bool
+
+    def since(self, last_idx: int) -> List[Dict[str, Any]]:
+        """The plays after index last_idx (-1 for all of them)."""
+        return self.plays[last_idx + 1:]
+
+
+class GameFeed:
+    """
+    Fetches play-by-play feeds on a pooled session with timeouts and keeps the
+    last feed of up to max_games games for conditional requests.
+
+        feed = GameFeed()
+        update = feed.fetch(2021020329)
+        new_events = update.since(last_idx)
+    """
+
+    def __init__(self, timeout=(3.05, 10), max_games: int = 32, url: str = FEED_URL):
+        self.timeout = timeout
+        self.max_games = max_games
+        self.url = url
+        self.session = requests.Session()
+        self._cache = OrderedDict()  # game_id -> (etag, last_modified, FeedUpdate)
+        self._lock = threading.Lock()
+
+
+    def fetch(self, game_id: int) -> FeedUpdate:
+        """The current feed of game_id; raises requests.RequestException on failure."""
+        with self._lock:
+            cached = self._cache.get(game_id)
+        headers = {}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        r = self.session.get(self.url.format(game_id=game_id), headers=headers, timeout=self.timeout)
+        if r.status_code == 304 and cached is not None:
+            with self._lock:
+                self._cache.move_to_end(game_id)
+            return cached[2]._replace(modified=False)
+        r.raise_for_status()
+
+        game_json = r.json()
+        # games that have not started yet have no clock / scores
+        try:
+            meta = extract_metadata(game_json)
+        except (KeyError, TypeError):
+            meta = None
+        update = FeedUpdate(game_json, extract_all_plays(game_json), meta, True)
+        with self._lock:
+            self._cache[game_id] = (r.headers.get("ETag"), r.headers.get("Last-Modified"), update)
+            self._cache.move_to_end(game_id)
+            while len(self._cache) > self.max_games:
+                self._cache.popitem(last=False)
+        return update
+
+
+    def close(self):
+        self.session.close()
@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import sys, os
 
@@ -7,7 +6,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from ift6758.ift6758.client.serving_client import ServingClient
-from scripts.step1_data.feature_engineering_milestone_3 import FeatureEngineering
+from scripts.step3_clients.game_feed import GameFeed
 
 SERVING_HOST = os.getenv("SERVING_HOST", "127.0.0.1")
 SERVING_PORT = int(os.getenv("SERVING_PORT", "5000"))
@@ -17,34 +16,19 @@ SERVING_PORT = int(os.getenv("SERVING_PORT", "5000"))
 last_seen = {}
 
 # Local ServingClient
+# (features are derived server side by /predict_events)
 client = ServingClient(
     ip=SERVING_HOST,
     port=SERVING_PORT,
-    features=["distance_from_net", "shot_angle", "empty_net"]
+    features=["distance_from_net", "shot_angle", "empty_net"],
+    priority="live",
 )
 
 # -------------------------------------------------------------
 # Fetch game JSON
 # -------------------------------------------------------------
-def get_game_json(game_id):
-    url = f"https://api-web.nhle.com/v1/gamecenter/{game_id}/play-by-play"
-    return requests.get(url).json()
-
-
-# -------------------------------------------------------------
-# Extract plays (supports new NHL API)
-# -------------------------------------------------------------
-def extract_all_plays(game_json):
-
-    # NEW NHL API FORMAT 
-    if "plays" in game_json and isinstance(game_json["plays"], list):
-        return game_json["plays"]
-
-    # OLD FORMAT 
-    try:
-        return game_json["liveData"]["plays"]["allPlays"]
-    except:
-        return []
+# one cached feed per game, shared by the events and the scoreboard
+feed = GameFeed()
 
 
 # -------------------------------------------------------------
@@ -98,10 +82,7 @@ def build_dataframe_for_predict(new_events, game_json):
         return pd.DataFrame()
 
     df = pd.DataFrame(rows)
-    # ---- APPLY FEATURE ENGINEERING ----
-    fe = FeatureEngineering()
-    df = fe.calculate_distance_from_net(df)
-    df = fe.calculate_empty_net(df)
+    # distance_from_net / shot_angle / empty_net are computed by the server
 
     print(f"DF BUILT FOR MODEL: {df.shape[0]} rows")
     return df
@@ -111,30 +92,34 @@ def build_dataframe_for_predict(new_events, game_json):
 # Poll + Predict
 # -------------------------------------------------------------
 def poll_and_predict(game_id: int):
+    """
+    Scores the events of game_id added since the previous call.
+    Returns (predictions or None, number of new events, scoreboard metadata or None).
+    """
     global last_seen
 
-    game_json = get_game_json(game_id)
-    all_plays = extract_all_plays(game_json)
+    update = feed.fetch(game_id)
+    all_plays = update.plays
 
     if not all_plays:
-        return None, 0
+        return None, 0, update.meta
 
     last_idx = last_seen.get(game_id, -1)
-    new_events = all_plays[last_idx + 1:]
+    new_events = update.since(last_idx)
 
     print("NEW EVENT TYPES:", [ev.get("typeDescKey") for ev in new_events])
 
     if not new_events:
-        return None, 0
+        return None, 0, update.meta
 
-    df_input = build_dataframe_for_predict(new_events, game_json)
+    df_input = build_dataframe_for_predict(new_events, update.game_json)
 
     if df_input.empty:
         last_seen[game_id] = len(all_plays) - 1
-        return None, 0
+        return None, 0, update.meta
 
-    df_output = client.predict(df_input)
+    df_output = client.predict_events(df_input)
 
     last_seen[game_id] = len(all_plays) - 1
 
-    return df_output, len(new_events)
+    return df_output, len(new_events), update.meta
@@ -0,0 +1,65 @@
+"""
+Checks that the prediction cache of ServingClient follows a swap of the
+server's default model: after the swap, rows that are all in the cache
+must get the new model's probabilities, as an uncached client does.
+
+Needs a running server with both models available, e.g. from the
+repository root:
+
+    $ python scripts/step3_clients/test_client_cache.py --port 8000 \
+        --before lr-distance:v1 --after lr-distance:v2
+"""
+import argparse
+import sys, os
+
+import numpy as np
+import pandas as pd
+
+project_root = os.getcwd()
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ift6758.ift6758.client.serving_client import ServingClient
+
+
+def swap(client, spec):
+    model, version = spec.split(":")
+    res = client.download_registry_model(model=model, version=version, wait=True)
+    assert "error" not in res, res
+    default = client.session.get(f"{client.base_url}/models").json()["default"]
+    assert (default["model"], default["version"]) == (model, version), default
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--before", default="lr-distance:v1", help="default model that fills the cache")
+    parser.add_argument("--after", default="lr-distance:v2", help="default model swapped in, with other coefficients")
+    parser.add_argument("--features", nargs="+", default=["distance_from_net"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({f: rng.integers(1, 90, 200).astype(float) for f in args.features})
+
+    cached = ServingClient(ip=args.ip, port=args.port, features=args.features, cache_size=10000)
+    fresh = ServingClient(ip=args.ip, port=args.port, features=args.features)
+
+    swap(cached, args.before)
+    before = cached.predict(X)["proba_goal"]
+    # every row is now cached
+    assert np.allclose(cached.predict(X)["proba_goal"], before)
+
+    swap(cached, args.after)
+    after = cached.predict(X)["proba_goal"]
+    expected = fresh.predict(X)["proba_goal"]
+    assert not np.allclose(expected, before), f"{args.before} and {args.after} give the same probabilities"
+    assert np.allclose(after, expected), "the cache served the probabilities of the swapped-out model"
+
+    swap(cached, args.before)
+    assert np.allclose(cached.predict(X)["proba_goal"], before)
+    print("OK: the cache follows the served model")
+
+
+if __name__ == "__main__":
+    main()
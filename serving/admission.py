@@ -0,0 +1,145 @@
+"""
+Admission control for the prediction endpoints.
+
+gunicorn's sync workers queue requests without limit, so under overload
+(dashboards and a backfill at the same time) interactive latency just
+grows. Work in flight is tracked in rows, not requests (a 100k-row bulk
+request is not a 1-row live one), in a counter shared by all the workers
+forked from the gunicorn master (preload_app), and each request is admitted
+according to its priority (X-Priority header):
+
+    live    live-game dashboards: always admitted (the priority lane)
+    normal  no header: admitted while the backlog stays under max_rows
+    bulk    backfills: admitted while it stays under bulk_fraction * max_rows,
+            optionally waiting up to `defer` seconds for room first
+
+Rejected requests get a Retry-After hint that grows with the backlog.
+
+The rows are counted per worker (one shared slot per pid), so the rows of
+a worker killed mid-request (timeout, SIGKILL) can be dropped: gunicorn's
+child_exit hook calls forget(pid), and the slots of pids that no longer
+exist are reclaimed when a new worker finds none free.
+
+The rows of a request are only known once its body is parsed; check() is
+the cheap test done before that, refusing a request whose priority is
+already over its limit without paying for the upload and the parse.
+"""
+
+from __future__ import annotations
+import math
+import multiprocessing
+import os
+import time
+from typing import Optional
+
+PRIORITIES = ("live", "normal", "bulk")
+
+
+class AdmissionController:
+
+    def __init__(self, max_rows: int, bulk_fraction: float = 0.5, defer: float = 0.0,
+                 retry_after: float = 1.0, poll: float = 0.005, slots: int = 64):
+        self.max_rows = max_rows
+        self.bulk_rows = int(max_rows * bulk_fraction)
+        self.defer = defer
+        self.retry_after = retry_after
+        self.poll = poll
+        # shared memory: created before fork, the workers all see the same slots
+        self._lock = multiprocessing.Lock()
+        self._pids = multiprocessing.RawArray("q", slots)
+        self._rows = multiprocessing.RawArray("q", slots)
+        self._slot = None
+        self._slot_pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 0
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(self._rows)
+
+    def _my_slot(self) -> int:
+        """Slot of this process, claimed on first use (called with the lock held)."""
+        pid = os.getpid()
+        if self._slot_pid == pid:
+            return self._slot
+        # a slot left with this pid by a dead worker whose pid was reused is taken over
+        free = [i for i, p in enumerate(self._pids) if p == pid] or [i for i, p in enumerate(self._pids) if p == 0]
+        if not free:
+            # no child_exit hook (or it missed a worker): reclaim the slots of dead pids
+            free = [i for i, p in enumerate(self._pids) if not _alive(p)]
+        if not free:
+            raise RuntimeError(f"No admission slot left for worker {pid} ({len(self._pids)} slots)")
+        self._slot, self._slot_pid = free[0], pid
+        self._pids[self._slot] = pid
+        self._rows[self._slot] = 0
+        return self._slot
+
+    def forget(self, pid: int) -> None:
+        """Drop the rows of a worker that exited (gunicorn child_exit hook)."""
+        with self._lock:
+            for i, p in enumerate(self._pids):
+                if p == pid:
+                    self._pids[i] = 0
+                    self._rows[i] = 0
+
+    def limit(self, priority: str) -> Optional[int]:
+        """Backlog (rows) above which a request of this priority is refused, None if never."""
+        if priority == "live":
+            return None
+        return self.bulk_rows if priority == "bulk" else self.max_rows
+
+    def _try_acquire(self, rows: int, limit: Optional[int]) -> bool:
+        with self._lock:
+            total = sum(self._rows)
+            # a request larger than the limit is still admitted when nothing else runs
+            if limit is not None and total > 0 and total + rows > limit:
+                return False
+            self._rows[self._my_slot()] += rows
+            return True
+
+    def _retry_after(self, limit: int) -> float:
+        backlog = self.in_flight() / max(limit, 1)
+        return float(math.ceil(self.retry_after * max(backlog, 1.0)))
+
+    def check(self, priority: str) -> Optional[float]:
+        """
+        Before reading a request: None if it may be admitted, else the seconds to wait
+        before retrying, when the backlog is already at the limit of its priority
+        (deferred bulk requests wait in acquire() instead).
+        """
+        limit = self.limit(priority)
+        if not self.enabled or limit is None or (priority == "bulk" and self.defer):
+            return None
+        if self.in_flight() < limit:
+            return None
+        return self._retry_after(limit)
+
+    def acquire(self, rows: int, priority: str) -> Optional[float]:
+        """Admit `rows` rows; returns None if admitted, else the seconds to wait before retrying."""
+        if not self.enabled:
+            return None
+        limit = self.limit(priority)
+        deadline = time.monotonic() + (self.defer if priority == "bulk" else 0.0)
+        while not self._try_acquire(rows, limit):
+            if time.monotonic() >= deadline:
+                return self._retry_after(limit)
+            time.sleep(self.poll)
+        return None
+
+    def release(self, rows: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._rows[self._my_slot()] -= rows
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
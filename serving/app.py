@@ -3,23 +3,49 @@ If you are in the same directory as this file (app.py), you can run run the app
     
     $ gunicorn --bind 0.0.0.0:<PORT> app:app
 
+or, with several workers sharing the model (what the Docker image does):
+
+    $ gunicorn -c gunicorn.conf.py app:app
+
 gunicorn can be installed via:
 
     $ pip install gunicorn
 
 """
 #imports
+import time
+IMPORT_STARTED = time.perf_counter()
 import os
 from pathlib import Path
 import logging
-from flask import Flask, jsonify, request, abort
-import sklearn
+from flask import Flask, jsonify, request, abort, Response, g, stream_with_context
+import numpy as np
 import pandas as pd
 import joblib
 #import ift6758
-import wandb
+# wandb is imported lazily (fetch_artifact, wb_login): it takes seconds to import
+# and is only needed when an artifact is not baked into the image
 import json
-import io
+import itertools
+from concurrent import futures
+import columnar
+from batching import MicroBatcher
+from features import EVENT_FEATURES, event_features, shot_geometry, target_net
+from grid import GridTable
+from registry import LoadedModel, ModelRegistry, feature_plan
+from loader import BackgroundLoader
+from jobs import JobManager
+from audit import AuditLog
+from drift import DriftMonitor
+from gzip_body import GzipRequestMiddleware
+from admission import PRIORITIES, AdmissionController
+from model_pointer import ModelPointer
+from log_buffer import setup_logging
+from metrics import LOAD_BUCKETS, ROWS_BUCKETS, MetricsRegistry, StageTimer
+from kernels import OUTPUTS, EnsembleKernel, make_kernel, output_column
+import portable
+# startup report (see /startup): import, model load and warm-up durations
+STARTUP = {"imports_sec": time.perf_counter() - IMPORT_STARTED}
 
 # notes
 #to run (when in ./serving): gunicorn --bind 0.0.0.0:8000 app:app
@@ -30,64 +56,229 @@ MODEL_NAMES=["lr-angle", "lr-distance", "lr-both"]
 
 LOG_FILE = "./flask.log"
 FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# lines kept in memory for /logs, and cap on the length of a single log message
+LOG_BUFFER_LINES = int(os.getenv("SERVING_LOG_BUFFER_LINES", "1000"))
+LOG_MAX_CHARS = int(os.getenv("SERVING_LOG_MAX_CHARS", "2000"))
 DEFAULT_WORKSPACE="IFT6758_team4"
 DEFAULT_PROJECT="milestone_2"
 DEFAULT_MODEL= MODEL_NAMES[1]
-CURRENT_MODEL_STRING = MODEL_NAMES[0]
 DEFAULT_VERSION="v1"
 ARTIFACT_DIR = f"../artifacts"
 os.makedirs(ARTIFACT_DIR, exist_ok=True)
 
+# micro-batching of concurrent /predict calls (see batching.py); 0 disables it.
+# Only useful with threaded workers, e.g. gunicorn --threads 8
+BATCH_WINDOW_MS = float(os.getenv("SERVING_BATCH_WINDOW_MS", "0"))
+BATCH_MAX_ROWS = int(os.getenv("SERVING_BATCH_MAX_ROWS", "1024"))
+
+# /predict_stream: NDJSON rows scored per chunk, and the largest columnar frame accepted
+STREAM_CHUNK_ROWS = int(os.getenv("SERVING_STREAM_CHUNK_ROWS", "10000"))
+STREAM_MAX_FRAME_ROWS = int(os.getenv("SERVING_STREAM_MAX_FRAME_ROWS", "100000"))
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+
+# asynchronous bulk scoring jobs (see jobs.py): results are spooled under JOB_DIR,
+# inputs must live under JOB_INPUT_DIR, at most JOBS_MAX_RUNNING run at once on the host
+JOB_DIR = os.getenv("SERVING_JOB_DIR", "../jobs")
+JOB_INPUT_DIR = os.getenv("SERVING_JOB_INPUT_DIR", "..")
+JOBS_MAX_RUNNING = int(os.getenv("SERVING_JOBS_MAX_RUNNING", "1"))
+JOB_PROCESSES = int(os.getenv("SERVING_JOB_PROCESSES", "2"))
+JOB_SHARD_ROWS = int(os.getenv("SERVING_JOB_SHARD_ROWS", "100000"))
+
+# request bodies sent with Content-Encoding: gzip may inflate to at most this (see gzip_body.py)
+MAX_INFLATED_MB = float(os.getenv("SERVING_MAX_INFLATED_MB", "1024"))
+
+# prediction audit log (see audit.py): inputs and outputs of a SAMPLE_RATE share of the
+# scored rows are written behind to AUDIT_DIR, at most BUFFER_MB waiting; 0 disables it
+AUDIT_DIR = os.getenv("SERVING_AUDIT_DIR", "../audit")
+AUDIT_SAMPLE_RATE = float(os.getenv("SERVING_AUDIT_SAMPLE_RATE", "1"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("SERVING_AUDIT_FLUSH_SECONDS", "5"))
+AUDIT_BUFFER_MB = float(os.getenv("SERVING_AUDIT_BUFFER_MB", "64"))
+AUDIT_ROTATE_ROWS = int(os.getenv("SERVING_AUDIT_ROTATE_ROWS", "1000000"))
+AUDIT_ROTATE_SECONDS = float(os.getenv("SERVING_AUDIT_ROTATE_SECONDS", "3600"))
+AUDIT = AuditLog(AUDIT_DIR, AUDIT_SAMPLE_RATE, flush_seconds=AUDIT_FLUSH_SECONDS,
+                 max_bytes=int(AUDIT_BUFFER_MB * 1024 * 1024),
+                 rotate_rows=AUDIT_ROTATE_ROWS, rotate_seconds=AUDIT_ROTATE_SECONDS)
+
+# live input drift of each model vs the reference profile next to its artifact (see drift.py)
+DRIFT = DriftMonitor(ARTIFACT_DIR)
+
+# admission control (see admission.py): rows in flight on the host before normal
+# requests get a 503 (bulk ones a 429 at BULK_FRACTION of it); 0 disables it
+ADMISSION_MAX_ROWS = int(os.getenv("SERVING_ADMISSION_MAX_ROWS", "500000"))
+ADMISSION_BULK_FRACTION = float(os.getenv("SERVING_ADMISSION_BULK_FRACTION", "0.5"))
+ADMISSION_DEFER_MS = float(os.getenv("SERVING_ADMISSION_DEFER_MS", "0"))
+ADMISSION_RETRY_AFTER = float(os.getenv("SERVING_ADMISSION_RETRY_AFTER", "1"))
+ADMISSION = AdmissionController(ADMISSION_MAX_ROWS, ADMISSION_BULK_FRACTION,
+                                ADMISSION_DEFER_MS / 1000.0, ADMISSION_RETRY_AFTER)
+
+# resident models (see registry.py); least recently used ones are evicted past this budget
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("SERVING_MODEL_MEMORY_MB", "256"))
+REGISTRY = ModelRegistry(int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024))
+
+# default model shared by all gunicorn workers (see model_pointer.py)
+POINTER = ModelPointer(os.getenv("SERVING_MODEL_POINTER", f"{ARTIFACT_DIR}/default_model.json"))
+POINTER_SYNC_TIMEOUT = 5.0
+
+# metrics served by /metrics (see metrics.py), summed over the gunicorn workers
+# through METRICS_DIR (set by gunicorn.conf.py; unset: this process only)
+METRICS_DIR = os.getenv("SERVING_METRICS_DIR") or None
+METRICS = MetricsRegistry(METRICS_DIR)
+REQUESTS = METRICS.counter("serving_requests_total", "HTTP requests handled", ["endpoint", "status"])
+REQUEST_SECONDS = METRICS.histogram("serving_request_seconds", "Request latency", labelnames=["endpoint"])
+STAGE_SECONDS = METRICS.histogram("serving_stage_seconds", "Latency of each request stage", labelnames=["endpoint", "stage"])
+MODEL_REQUESTS = METRICS.counter("serving_model_requests_total", "Prediction requests per model", ["model", "version"])
+PREDICT_ROWS = METRICS.histogram("serving_predict_rows", "Rows per prediction request", ROWS_BUCKETS, ["endpoint"])
+MODEL_LOAD_SECONDS = METRICS.histogram("serving_model_load_seconds", "Model download + load + warm-up time", LOAD_BUCKETS, ["model"])
+SHED_REQUESTS = METRICS.counter("serving_shed_requests_total", "Requests refused by admission control", ["endpoint", "priority"])
+ROWS_IN_FLIGHT = METRICS.gauge("serving_rows_in_flight", "Rows being scored on this host (all workers)", ADMISSION.in_flight)
+STARTUP_SECONDS = METRICS.gauge("serving_startup_seconds", "Time from import to ready to serve", lambda: STARTUP.get("total_sec", 0.0))
+MODEL_SWAP_SECONDS = METRICS.histogram("serving_model_swap_seconds", "Time from swap request to new default model", LOAD_BUCKETS, ["model"])
+AUDIT_BUFFERED = METRICS.gauge("serving_audit_buffered_bytes", "Audit rows waiting to be written (this worker)", AUDIT.buffered_bytes)
+AUDIT_DROPPED = METRICS.gauge("serving_audit_dropped_rows", "Audit rows dropped because the buffer was full (this worker)", lambda: AUDIT.dropped)
+
 
 app = Flask(__name__)
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app, int(MAX_INFLATED_MB * 1024 * 1024))
 
-def download_model(workspace, project, model_name, version):
-    global MODEL
-    global CURRENT_MODEL_STRING
+def fetch_artifact(workspace, project, model_name, version):
+    """Make sure the model artifact is in ARTIFACT_DIR, downloading it from W&B if needed."""
     model_path = f'{ARTIFACT_DIR}/{model_name}:{version}/{model_name}.joblib'
 
     if os.path.exists(model_path):
         log_message=f'Model {model_name} already downloaded.'
         app.logger.info(log_message) # debug, info, warning, error, critical
-        MODEL = joblib.load(model_path)
-        log_message=f'Model {model_name} is loaded'
-        app.logger.info(log_message) 
+        return model_path
+
+    try:
+        import wandb
+    except ImportError as e:
+        raise RuntimeError(f'Model {model_name} failed to download. Exception: {e}')
+
+    try:
+        wb_login()
+        run = wandb.init(project=project) 
+
+        wb_path = f"{workspace}/{project}/{model_name}:{version}"
+        artifact = run.use_artifact(wb_path, type='model')
+        artifact.download(root=f'{ARTIFACT_DIR}/{model_name}:{version}')
+    except Exception as e:
+        raise RuntimeError(f'Model {model_name} failed to download. Exception: {e}')
+    finally:
+        wandb.finish()
+
+    log_message=f'Model {model_name} was successfully downloaded. '
+    app.logger.info(log_message) 
+    return model_path
+
+
+def load_model(workspace, project, model_name, version, report=lambda stage: None):
+    """
+    Return the resident LoadedModel for this key, loading it into the registry
+    (with its feature plan and grid table, warmed up) if it is not there yet.
+    Runs on the LOADER threads; report(stage) publishes progress to /download_status.
+    """
+    key = (workspace, project, model_name, version)
+    entry = REGISTRY.get(key)
+    if entry is not None:
+        return entry
+
+    started = time.perf_counter()
+    # a portable coefficient artifact is loaded with NumPy only (see portable.py);
+    # the joblib one (and sklearn) only for models it cannot express
+    portable_path = portable.artifact_path(ARTIFACT_DIR, model_name, version)
+    use_portable = os.path.exists(portable_path)
+    if not use_portable:
+        report("downloading")
+        model_path = fetch_artifact(workspace, project, model_name, version)
+    report("loading")
+    try:
+        if use_portable:
+            model = None
+            kernel, features, artifact = portable.load_linear(portable_path)
+            app.logger.info(f'Model {model_name}:{version} loaded from {portable_path} ({artifact["hash"][:12]})')
+        else:
+            # memory-mapped: workers loading the same artifact share its pages
+            model = joblib.load(model_path, mmap_mode="r")
+    except Exception as e:
+        raise RuntimeError(f'Model {model_name} failed loaded. Exception: {e}')
+
+    report("warming up")
+    if model is not None:
+        features = feature_plan(model, model_name)
+        kernel = make_kernel(model)
+    if features:
+        run_model(kernel, np.zeros((1, len(features))))
+    entry = LoadedModel(key, model, kernel, features, build_grid(kernel, model_name, features))
+    evicted = REGISTRY.put(entry)
+    MODEL_LOAD_SECONDS.observe(time.perf_counter() - started, model=model_name)
+    log_message=f'Model {model_name}:{version} is loaded'
+    app.logger.info(log_message) 
+    for old_key in evicted:
+        app.logger.info(f'Model {old_key[2]}:{old_key[3]} evicted from memory')
+    return entry
+
+
+def swap_default(entry):
+    """Point /predict at a loaded model. Called by LOADER once the model is warmed up."""
+    for old_key in REGISTRY.set_default(entry.key):
+        app.logger.info(f'Model {old_key[2]}:{old_key[3]} evicted from memory')
+    app.logger.info(f'Default model is now {entry.name}:{entry.version}')
+
+
+def request_swap(key):
+    """Load key in the background, make it the default and publish it to the other workers."""
+    job = LOADER.submit(key, make_default=True)
+
+    def publish(future):
+        if future.exception() is None:
+            MODEL_SWAP_SECONDS.observe(time.time() - job.submitted, model=key[2])
+            POINTER.publish(key)
+
+    job.future.add_done_callback(publish)
+    return job
+
+
+def follow_pointer():
+    """
+    Swap to the default model published by another worker, if it changed.
+    The artifact is already on disk, so the request waits (briefly) for the
+    swap rather than being answered by the old model.
+    """
+    key = POINTER.changed()
+    if key is not None and key != REGISTRY.default_key:
+        app.logger.info(f'Default model changed by another worker: {key[2]}:{key[3]}')
+        job = LOADER.submit(key, make_default=True)
+        futures.wait([job.future], timeout=POINTER_SYNC_TIMEOUT)
+
+
+def download_model(workspace, project, model_name, version):
+    """Load a model and make it the default one for /predict, waiting for the swap."""
+    job = request_swap((workspace, project, model_name, version))
+    try:
+        job.future.result()
+    except Exception as e:
+        log_message=str(e)
+        app.logger.error(log_message)
         print(log_message)
-        CURRENT_MODEL_STRING=model_name
-        return {"info":log_message}
-    
-    else:
-        try:
-            wb_login()
-            run = wandb.init(project=project) 
-
-            wb_path = f"{workspace}/{project}/{model_name}:{version}"
-            artifact = run.use_artifact(wb_path, type='model')
-            artifact.download(root=f'{ARTIFACT_DIR}/{model_name}:{version}')
-
-            log_message=f'Model {model_name} was successfully downloaded. '
-            app.logger.info(log_message) 
-            try:
-                MODEL = joblib.load(model_path)
-                log_message=f'Model {model_name} is loaded. '
-                app.logger.info(log_message)
-                CURRENT_MODEL_STRING=model_name
-            except Exception as e:
-                log_message=f'Model {model_name} failed loaded.'
-                app.logger.error(log_message)
-                return  {"error":log_message}
-            return {"info":log_message}
-        
-        except Exception as e:
+        return {"error":log_message}
 
-            log_message=f'Model {model_name} failed to download. Exception: {e}'
-            app.logger.error(log_message)
-            print(log_message)
+    log_message=f'Model {model_name} is loaded'
+    app.logger.info(log_message) 
+    print(log_message)
+    return {"info":log_message}
 
-            return {"error":log_message}
 
-        finally:
-            wandb.finish()
+def build_grid(kernel, model_name, features):
+    """Precompute the rink-grid lookup table of a freshly loaded model."""
+    if not features:
+        return None
+    try:
+        grid = GridTable(kernel, features)
+        app.logger.info(f'Grid table for {model_name} built: {grid.pred.shape}')
+        return grid
+    except Exception as e:
+        app.logger.error(f'Could not build grid table for {model_name}: {e}')
+        return None
 
 
 def load_wandb_key(path="./WANDB_API_KEY.txt"):
@@ -102,6 +293,7 @@ def load_wandb_key(path="./WANDB_API_KEY.txt"):
 
 
 def wb_login():   
+    import wandb
 
     api_key = os.environ.get("WANDB_API_KEY")
     if not api_key:
@@ -125,21 +317,82 @@ def before_first_request():
 
     """
     Load default model, 
+    (the last one published by a worker if any, so a restart keeps the swap)
     
     """
-    logging.basicConfig(filename=LOG_FILE, 
-                        filemode="w",
-                        level=logging.INFO, format=FORMAT)
+    global LOG_BUFFER
+    LOG_BUFFER = setup_logging(LOG_FILE, FORMAT, logging.INFO,
+                               capacity=LOG_BUFFER_LINES, max_chars=LOG_MAX_CHARS)
+
+    default_key = (DEFAULT_WORKSPACE, DEFAULT_PROJECT, DEFAULT_MODEL, DEFAULT_VERSION)
+    key = POINTER.read() or default_key
+    response = download_model(*key)
+    if "error" in response and key != default_key:
+        response = download_model(*default_key)
+    return response
 
+def run_model(kernel, X_arr):
+    """(goal probabilities, predicted classes) from the model's kernel (see kernels.py)."""
+    return kernel.score(X_arr)
 
+BATCHER = MicroBatcher(run_model, BATCH_WINDOW_MS, BATCH_MAX_ROWS) if BATCH_WINDOW_MS > 0 else None
+LOADER = BackgroundLoader(lambda key, report: load_model(*key, report=report), swap_default)
+JOBS = JobManager(JOB_DIR, JOB_INPUT_DIR, lambda key: LOADER.submit(key).future.result(),
+                  max_running=JOBS_MAX_RUNNING, processes=JOB_PROCESSES, shard_rows=JOB_SHARD_ROWS)
 
-    return download_model(DEFAULT_WORKSPACE, DEFAULT_PROJECT, DEFAULT_MODEL, DEFAULT_VERSION)
+def record_predictions(entry, endpoint, inputs, p_goal, y_pred):
+    """
+    Queue scored rows for the audit log (see audit.py) and update the drift
+    sketches of the model (see drift.py); inputs is {column: array}.
+    """
+    AUDIT.record(entry.name, entry.version, endpoint, inputs, p_goal, y_pred)
+    DRIFT.update(entry.name, entry.version, entry.features or [], inputs, p_goal)
 
 def is_missing(value):
     return value is None or (isinstance(value, str) and value.strip() == "")
 
+phase_started = time.perf_counter()
 mes = before_first_request()
 print(mes)
+STARTUP["model_sec"] = time.perf_counter() - phase_started
+
+
+@app.before_request
+def sync_default_model():
+    g.started = time.perf_counter()
+    g.timer = StageTimer()
+    follow_pointer()
+
+
+@app.after_request
+def record_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    elapsed = time.perf_counter() - g.started
+    REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    for name, seconds in g.timer.stages:
+        STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=name)
+    g.timer.stages.append(("total", elapsed))
+    response.headers["Server-Timing"] = g.timer.server_timing()
+    return response
+
+
+@app.teardown_request
+def release_admission(exc):
+    rows = g.pop("admitted_rows", 0)
+    if rows:
+        ADMISSION.release(rows)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus text format metrics: per-stage latency histograms, request and
+    per-model counters, rows per request, model load and swap durations.
+    Counters and histograms are summed over all the workers of the host (see
+    metrics.py); gauges are those of the worker that answers.
+    """
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/")
@@ -152,20 +405,49 @@ def hello():
 @app.route("/logs", methods=["GET"])
 def logs():
 
-    """Reads data from the log file 
-    and returns them as the response"""
+    """Returns the last log lines of this worker 
+    from the in-memory buffer (see log_buffer.py)"""
     N = 100
-    logs=[]
-    # read the log file specified and return the data
-    with open("flask.log", "r") as f:
-        lines = f.readlines()[-N:]
-        for line in lines:
-            logs.append(line.strip())
-    response=logs
+    response = [line.strip() for line in LOG_BUFFER.tail(N)]
 
     return jsonify({"Flask logs":response})
 
 
+@app.route("/startup", methods=["GET"])
+def startup():
+    """
+    How long this app took to start: imports, default model load and warm-up
+    (measured once, in the gunicorn master when the app is preloaded).
+    """
+    return jsonify(STARTUP)
+
+
+@app.route("/batch_stats", methods=["GET"])
+def batch_stats():
+    """Queue depth and batch size statistics of the /predict micro-batcher (this worker only)."""
+    if BATCHER is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **BATCHER.stats()})
+
+
+@app.route("/drift", methods=["GET"])
+def drift():
+    """
+    Streaming sketches (histogram, quantiles, mean/std) of the features and
+    proba_goal of every model scored by this worker, with PSI and KS against
+    the model's reference profile when it has one. ?model= and ?version=
+    restrict the report, ?histograms=true adds the bin counts.
+    """
+    histograms = request.args.get("histograms", "").lower() in ("1", "true", "yes")
+    return jsonify(DRIFT.report(request.args.get("model"), request.args.get("version"), histograms))
+
+
+@app.route("/models", methods=["GET"])
+def models():
+    """Resident models, the default one and the registry memory budget (this worker only)."""
+    return jsonify(REGISTRY.describe())
+
+
 @app.route("/download_registry_model", methods=["POST"])
 def download_registry_model():
     """
@@ -176,7 +458,12 @@ def download_registry_model():
             project: (required),
             model: (required),
             version: (required),
+            wait: (optional) block until the swap is done, default false
         }
+    The download and load run in the background (see loader.py); the default
+    model is swapped once the new one is loaded and warmed up. Progress is
+    reported by /download_status.
+
     COMET API KEY instructions bellow were ignored
     The comet API key should be retrieved from the ${COMET_API_KEY} environment variable.
     #comet_api_key = os.getenv("COMET_API_KEY")
@@ -203,88 +490,843 @@ def download_registry_model():
     version=data.get("version")
 
     # Load the model
-    response = download_model(workspace,project,model_name,version) 
-    #print(MODEL.feature_names_in_)
-    return jsonify(response)
+    if data.get("wait"):
+        response = download_model(workspace,project,model_name,version) 
+        return jsonify(response)
+
+    job = request_swap((workspace, project, model_name, version))
+    log_message=f'Swap to model {model_name}:{version} started'
+    app.logger.info(log_message)
+    return jsonify({"info": log_message, "status": job.describe()})
+
 
+@app.route("/download_status", methods=["GET"])
+def download_status():
+    """Model loads in flight and recently finished ones (this worker only), newest first."""
+    default = REGISTRY.default()
+    return jsonify({
+        "default": default.describe() if default else None,
+        "jobs": LOADER.jobs(),
+    })
+
+
+
+def parse_body(mimetype, body):
+    """
+    {column: 1-D array} of a raw request body, for both front ends (read_columns
+    and asgi.py): the columnar binary format from columnar.py when mimetype is
+    its Content-Type (application/x-xg-columns), else JSON in the
+    DataFrame.to_json() layout, parsed once and built with pd.DataFrame.
+    Raises ValueError.
+    """
+    if mimetype == columnar.CONTENT_TYPE:
+        try:
+            return columnar.decode_columns(body)
+        except Exception as e:
+            raise ValueError(f"Could not parse columnar data: {e}")
+    if not body:
+        raise ValueError("No data received")
+    try:
+        json_data = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Could not parse json data: {e}")
+    if json_data is None:
+        raise ValueError("No data received")
+    try:
+        X = pd.DataFrame(json_data)
+        return {c: X[c].values for c in X.columns}
+    except Exception as e:
+        raise ValueError(f"Could not parse json data: {e}")
+
+
+def read_columns():
+    """
+    Parse the request body into {column: 1-D array} (see parse_body).
+    Returns (columns, error_message).
+    """
+    try:
+        with g.timer.stage("parse"):
+            columns = parse_body(request.mimetype, request.get_data())
+    except ValueError as e:
+        return None, str(e)
+    app.logger.info(f"{request.path}: {request.mimetype or 'json'} payload received, columns: {list(columns)}")
+    return columns, None
+
+
+def requested_outputs():
+    """
+    Outputs listed in ?outputs=prediction,proba_goal (any of OUTPUTS).
+    Returns (outputs or None when not given, error_message).
+    """
+    return parse_outputs(request.args.get("outputs"))
+
+
+def parse_outputs(raw):
+    """requested_outputs() for a raw ?outputs= value (also used by asgi.py)."""
+    if is_missing(raw):
+        return None, None
+    outputs = [o.strip() for o in raw.split(",") if o.strip()]
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        return None, f"Unknown outputs: {unknown}, expected some of {list(OUTPUTS)}"
+    return outputs, None
+
+
+def prediction_response(entry, y_pred, p_goal, required, features=None, **extra):
+    """
+    Build the /predict style response, columnar when the client asked for it.
+    With ?outputs=..., only the requested outputs are returned.
+    features: optional {name: array} of derived feature columns to send back too.
+    """
+    features = features or {}
+    MODEL_REQUESTS.inc(model=entry.name, version=entry.version)
+    PREDICT_ROWS.observe(len(y_pred), endpoint=request.endpoint)
+
+    outputs, log_message = requested_outputs()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    if wants_columnar():
+        with g.timer.stage("serialize"):
+            body = prediction_frame(y_pred, p_goal, outputs, features)
+        return Response(body, mimetype=columnar.CONTENT_TYPE, headers=model_headers(entry, required))
+
+    with g.timer.stage("serialize"):
+        response = prediction_json(entry, y_pred, p_goal, required, outputs, features, **extra)
+
+        # the full response can be megabytes: only log it at debug level
+        app.logger.info(f"Returning {len(y_pred)} predictions from {entry.name}:{entry.version}")
+        app.logger.debug(response)
+        return jsonify(response)  # response must be json serializable!
+
+
+def prediction_frame(y_pred, p_goal, outputs=None, features=None):
+    """Columnar body of a prediction response: the outputs (all by default), then the features."""
+    return columnar.encode_columns({
+        **{name: output_column(name, y_pred, p_goal) for name in (outputs or OUTPUTS)},
+        **(features or {}),
+    })
+
+
+def model_headers(entry, required):
+    """Headers describing the model behind a columnar response."""
+    return {
+        "X-Model-Name": entry.name,
+        "X-Model-Version": entry.version,
+        "X-Used-Features": ",".join(required),
+    }
+
+
+def prediction_json(entry, y_pred, p_goal, required, outputs=None, features=None, **extra):
+    """
+    JSON body of a prediction response: the legacy predictions/probabilities
+    keys, or only the requested outputs.
+    """
+    if outputs is None:
+        response = {
+            "predictions": y_pred.tolist(),
+            "probabilities": np.column_stack([1.0 - p_goal, p_goal]).tolist(),
+        }
+    else:
+        response = {name: output_column(name, y_pred, p_goal).tolist() for name in outputs}
+    if features:
+        response["features"] = {name: np.asarray(v).tolist() for name, v in features.items()}
+    response.update({
+        "n_samples": len(y_pred),
+        "used_features": required,
+        "model_name": entry.name,
+        "model_version": entry.version,
+        **extra,
+    })
+    return response
+
+
+def model_key(args):
+    """
+    Registry key of the model picked by a query string (?model=...&version=...,
+    workspace and project default to the team's), or None for the default model.
+    """
+    if is_missing(args.get("model")):
+        return None
+    return (args.get("workspace", DEFAULT_WORKSPACE),
+            args.get("project", DEFAULT_PROJECT),
+            args.get("model"),
+            args.get("version", DEFAULT_VERSION))
+
+
+def selected_model():
+    """
+    Model chosen by the request's query string (?model=...&version=...,
+    workspace and project default to the team's), or the default model.
+    Returns (LoadedModel, error_message).
+    """
+    key = model_key(request.args)
+    if key is None:
+        key = REGISTRY.default_key
+        entry = REGISTRY.get(key) if key else None
+        if entry is None:
+            return None, "No model loaded"
+        return entry, None
+    return resident_model(key)
+
+
+def resident_model(key):
+    """The registry entry of key, loading it first if needed. Returns (LoadedModel, error_message)."""
+    entry = REGISTRY.get(key)
+    if entry is not None:
+        return entry, None
+
+    # not resident yet: load it (or wait for the load already in flight)
+    try:
+        entry = LOADER.submit(key).future.result()
+    except Exception as e:
+        return None, str(e)
+    return entry, None
+
+
+def n_rows(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def request_priority(default_priority="normal"):
+    """The request's X-Priority (live, normal or bulk), default_priority if missing or unknown."""
+    priority = request.headers.get("X-Priority", default_priority).strip().lower()
+    return priority if priority in PRIORITIES else default_priority
+
+
+def shed(priority, retry_after, log_message):
+    """The 429 (bulk) / 503 response refusing an overloaded request, with a Retry-After header."""
+    SHED_REQUESTS.inc(endpoint=request.endpoint, priority=priority)
+    app.logger.warning(log_message)
+    response = jsonify({"error": log_message, "retry_after": retry_after})
+    response.status_code = 429 if priority == "bulk" else 503
+    response.headers["Retry-After"] = str(int(retry_after))
+    return response
+
+
+def admit_early(default_priority="normal"):
+    """
+    Admission check before the body is read: a request whose priority is already
+    over its limit is refused without paying for the upload, inflate and parse.
+    Returns None or the response to send (see admit).
+    """
+    priority = request_priority(default_priority)
+    retry_after = ADMISSION.check(priority)
+    if retry_after is None:
+        return None
+    length = request.content_length
+    return shed(priority, retry_after, f"Overloaded: {ADMISSION.in_flight()} rows in flight, {priority} request "
+                                       f"of {'?' if length is None else length} bytes refused before reading it")
+
+
+def admit(rows, default_priority="normal"):
+    """
+    Admission control (see admission.py): reserve `rows` rows of the backlog
+    for this request at its X-Priority (live, normal or bulk); they are
+    released when the request is torn down.
+    Returns None if admitted, else the 429 (bulk) / 503 response to send,
+    with a Retry-After header.
+    """
+    priority = request_priority(default_priority)
+    retry_after = ADMISSION.acquire(rows, priority)
+    if retry_after is None:
+        g.admitted_rows = g.get("admitted_rows", 0) + rows
+        return None
+    return shed(priority, retry_after,
+                f"Overloaded: {ADMISSION.in_flight()} rows in flight, {priority} request of {rows} rows refused")
+
+
+def wants_columnar():
+    """True when the Accept header explicitly lists the columnar type (*/* does not count)."""
+    return any(mimetype == columnar.CONTENT_TYPE for mimetype, _ in request.accept_mimetypes)
 
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    global MODEL
     """
     Handles POST requests made to http://IP_ADDRESS:PORT/predict
 
+    The body is JSON or columnar (see read_columns); the response is columnar
+    too when the client sends it in its Accept header.
+    A resident model other than the default can be picked with
+    ?model=lr-both&version=v1 (see selected_model), and the response
+    trimmed to some outputs with ?outputs=proba_goal (see requested_outputs).
+    Under overload the request may be refused with a 503 and Retry-After
+    (429 for X-Priority: bulk); X-Priority: live is always served (see admit).
+
     Returns predictions
     """
-    # Get POST json data
-    json_data = request.get_json()
-    #app.logger.info(json)
+    rejected = admit_early()
+    if rejected is not None:
+        return rejected
 
-    if json_data is None:
-        log_message="No data received"
+    columns, log_message = read_columns()
+    if log_message:
         app.logger.error(log_message)
         return jsonify({"error": log_message})
-    
-    app.logger.info("json received")
+
+    rejected = admit(n_rows(columns))
+    if rejected is not None:
+        return rejected
+
     app.logger.info("/predicting...")
-    app.logger.info(f"/predict: received keys: {list(json_data.keys())}")
+    log_message="Parsing data successful"
+    app.logger.info(log_message)
+
+    with g.timer.stage("validate"):
+        entry, log_message = selected_model()
+        if log_message:
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+
+        required = entry.features
+        if required is None:
+            log_message = f"No feature list known for model {entry.name}"
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+
+        missing = []
+        for i in required:
+            if i not in columns:
+                missing.append(i)
+
+        if missing:
+            log_message = f"Missing required features: {missing}"
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+
+        X_arr = columnar.to_matrix(columns, required)
+    app.logger.info(f"/predict: input shape: {X_arr.shape}")
 
     try:
-        X = pd.read_json(io.StringIO(json.dumps(json_data)))
+        if BATCHER is not None:
+            with g.timer.stage("batched_inference"):
+                p_goal, y_pred = BATCHER.submit(entry.kernel, X_arr)
+        else:
+            with g.timer.stage("inference"):
+                p_goal, y_pred = run_model(entry.kernel, X_arr)
+    except Exception as e:
+        log_message = f"Prediction failed: {e}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    app.logger.info(f"Predicted {len(y_pred)} shots.")
+    record_predictions(entry, request.endpoint, {f: columns[f] for f in required}, p_goal, y_pred)
+
+    # Return response
+    return prediction_response(entry, y_pred, p_goal, required)
+
+
+@app.route("/predict_coordinates", methods=["POST"])
+def predict_coordinates():
+    """
+    Handles POST requests made to http://IP_ADDRESS:PORT/predict_coordinates
+
+    Scores shots from raw rink coordinates instead of derived features.
+    Expected columns: x_coord, y_coord, period, home (shooter is the home team).
+    On-grid shots are read from the model's precomputed table (see grid.py),
+    the others go through the model.
+    """
+    rejected = admit_early()
+    if rejected is not None:
+        return rejected
+
+    columns, log_message = read_columns()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    rejected = admit(n_rows(columns))
+    if rejected is not None:
+        return rejected
 
+    missing = [c for c in ["x_coord", "y_coord", "period", "home"] if c not in columns]
+    if missing:
+        log_message = f"Missing required columns: {missing}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    entry, log_message = selected_model()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    if entry.grid is None:
+        log_message = f"No grid table available for model {entry.name}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    x = np.asarray(columns["x_coord"], dtype=float)
+    y = np.asarray(columns["y_coord"], dtype=float)
+    try:
+        with g.timer.stage("features"):
+            net_x = target_net(x, y, columns["period"], columns["home"])
+        with g.timer.stage("grid_lookup"):
+            p_goal, y_pred, n_lookup = entry.grid.lookup(entry.kernel, x, y, net_x)
     except Exception as e:
-        log_message=f"Could not parse json data: {e}"
+        log_message = f"Prediction failed: {e}"
         app.logger.error(log_message)
         return jsonify({"error": log_message})
-    
-    log_message="Parsing json data successful"
-    app.logger.info(log_message)
 
-    if CURRENT_MODEL_STRING == "lr-distance":
-        required = ["distance_from_net"]
-    elif CURRENT_MODEL_STRING == "lr-angle":
-        required = ["shot_angle"]
-    elif CURRENT_MODEL_STRING == "lr-both":
-        required = ["distance_from_net", "shot_angle"]
+    app.logger.info(f"Predicted {len(y_pred)} shots ({n_lookup} from the grid table).")
+    # audit and drift see the model's features, as for /predict_events
+    derived = dict(zip(["distance_from_net", "shot_angle"], shot_geometry(x, y, net_x)))
+    record_predictions(entry, request.endpoint, {f: derived[f] for f in entry.grid.required}, p_goal, y_pred)
+    return prediction_response(entry, y_pred, p_goal, entry.grid.required, n_grid_lookups=n_lookup)
+
+
+@app.route("/predict_events", methods=["POST"])
+def predict_events():
+    """
+    Handles POST requests made to http://IP_ADDRESS:PORT/predict_events
+
+    Scores raw NHL shot events: the server derives distance_from_net,
+    shot_angle and empty_net itself (vectorized, see features.py) and scores
+    them in the same pass, so clients do not need FeatureEngineering.
+    Expected columns: x_coord, y_coord, period, home (shooter is the home
+    team), situation_code. The derived features are returned with the
+    predictions.
+    """
+    rejected = admit_early()
+    if rejected is not None:
+        return rejected
+
+    columns, log_message = read_columns()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
 
-    missing = []
-    for i in required:
-        if i not in X.columns:
-            missing.append(i)
+    rejected = admit(n_rows(columns))
+    if rejected is not None:
+        return rejected
 
+    missing = [c for c in ["x_coord", "y_coord", "period", "home", "situation_code"] if c not in columns]
+    if missing:
+        log_message = f"Missing required columns: {missing}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    entry, log_message = selected_model()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    required = entry.features
+    unknown = [f for f in (required or []) if f not in EVENT_FEATURES]
+    if required is None or unknown:
+        log_message = f"Model {entry.name} needs features that cannot be derived from events: {unknown or required}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    x = np.asarray(columns["x_coord"], dtype=float)
+    y = np.asarray(columns["y_coord"], dtype=float)
+    try:
+        with g.timer.stage("features"):
+            derived = event_features(x, y, columns["period"], columns["home"], columns["situation_code"])
+        if entry.grid is not None:
+            with g.timer.stage("grid_lookup"):
+                p_goal, y_pred, _ = entry.grid.lookup(entry.kernel, x, y, derived["net_x"])
+        else:
+            with g.timer.stage("inference"):
+                p_goal, y_pred = run_model(entry.kernel, columnar.to_matrix(derived, required))
+    except Exception as e:
+        log_message = f"Prediction failed: {e}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    app.logger.info(f"Predicted {len(y_pred)} raw events.")
+    record_predictions(entry, request.endpoint, {f: derived[f] for f in required}, p_goal, y_pred)
+    features = {name: derived[name] for name in EVENT_FEATURES}
+    return prediction_response(entry, y_pred, p_goal, required, features=features)
+
+
+def records_to_columns(rows, names):
+    """{column: float array} for the given names from a list of NDJSON records (absent values are NaN)."""
+    return {n: np.array([row.get(n) for row in rows], dtype=float)
+            for n in names if any(n in row for row in rows)}
+
+
+def stream_chunks(required):
+    """
+    Yield {column: array} chunks read incrementally from the request body:
+    NDJSON records grouped by STREAM_CHUNK_ROWS, or consecutive columnar frames.
+    Only one chunk is held in memory at a time.
+    """
+    if request.mimetype == columnar.CONTENT_TYPE:
+        yield from columnar.read_frames(request.stream, max_rows=STREAM_MAX_FRAME_ROWS)
+        return
+    if request.mimetype not in NDJSON_TYPES:
+        raise ValueError(f"Unsupported Content-Type {request.mimetype}, "
+                         f"expected one of {[*NDJSON_TYPES, columnar.CONTENT_TYPE]}")
+
+    rows = []
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        rows.append(json.loads(line))
+        if len(rows) >= STREAM_CHUNK_ROWS:
+            yield records_to_columns(rows, required)
+            rows = []
+    if rows:
+        yield records_to_columns(rows, required)
+
+
+@app.route("/predict_stream", methods=["POST"])
+def predict_stream():
+    """
+    Handles POST requests made to http://IP_ADDRESS:PORT/predict_stream
+
+    Bulk scoring with bounded memory. The body is read incrementally, either
+    NDJSON (one record per line, Content-Type: application/x-ndjson, scored
+    STREAM_CHUNK_ROWS at a time) or consecutive columnar frames (see
+    columnar.py). Each chunk is scored as soon as it is read and its results
+    are streamed back right away, in input order:
+      - NDJSON: one line per chunk, {"offset", "n_samples", <outputs>}, then a
+        final {"done": true, "n_samples", "model_name", ...} line. An error in
+        the middle of the stream is sent as an {"error", "offset"} line.
+      - columnar (when the Accept header asks for it): one frame per chunk;
+        the stream stops early on error.
+    ?model=, ?version= and ?outputs= work as for /predict. Errors found
+    before the first chunk is scored are returned as usual. Streams count as
+    X-Priority: bulk for admission control unless the header says otherwise.
+    """
+    entry, log_message = selected_model()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    required = entry.features
+    if required is None:
+        log_message = f"No feature list known for model {entry.name}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    outputs, log_message = requested_outputs()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+    outputs = outputs or list(OUTPUTS)
+
+    rejected = admit_early(default_priority="bulk")
+    if rejected is not None:
+        return rejected
+
+    # read the first chunk now so bad requests still get a plain JSON error
+    chunks = stream_chunks(required)
+    try:
+        first = next(chunks, None)
+    except Exception as e:
+        log_message = f"Could not parse stream: {e}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+    if first is None:
+        log_message = "No data received"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    missing = [f for f in required if f not in first]
     if missing:
         log_message = f"Missing required features: {missing}"
         app.logger.error(log_message)
         return jsonify({"error": log_message})
 
-    app.logger.info(f"/predict: DataFrame shape: {X.shape}")
+    # streams are bulk work unless told otherwise; one chunk's rows stay reserved until the end
+    rejected = admit(n_rows(first), default_priority="bulk")
+    if rejected is not None:
+        return rejected
+    # teardown_request runs when the view returns, before the body is streamed:
+    # the rows are released when the server closes the response instead
+    admitted_rows = g.pop("admitted_rows", 0)
+
+    as_columnar = wants_columnar()
+    endpoint = request.endpoint
+
+    def encode(columns):
+        if as_columnar:
+            return columnar.encode_columns(columns)
+        return json.dumps({k: v.tolist() if isinstance(v, np.ndarray) else v
+                           for k, v in columns.items()}) + "\n"
+
+    def generate():
+        offset = 0
+        inference_seconds = 0.0
+        try:
+            for columns in itertools.chain([first], chunks):
+                missing = [f for f in required if f not in columns]
+                if missing:
+                    raise ValueError(f"Missing required features: {missing}")
+                started = time.perf_counter()
+                p_goal, y_pred = run_model(entry.kernel, columnar.to_matrix(columns, required))
+                inference_seconds += time.perf_counter() - started
+                record_predictions(entry, endpoint, {f: columns[f] for f in required}, p_goal, y_pred)
+
+                results = {name: output_column(name, y_pred, p_goal) for name in outputs}
+                if not as_columnar:
+                    results = {"offset": offset, "n_samples": len(y_pred), **results}
+                yield encode(results)
+                offset += len(y_pred)
+        except Exception as e:
+            log_message = f"Stream failed after {offset} rows: {e}"
+            app.logger.error(log_message)
+            if not as_columnar:
+                yield json.dumps({"error": log_message, "offset": offset}) + "\n"
+            return
+        finally:
+            MODEL_REQUESTS.inc(model=entry.name, version=entry.version)
+            PREDICT_ROWS.observe(offset, endpoint=endpoint)
+            STAGE_SECONDS.observe(inference_seconds, endpoint=endpoint, stage="inference")
+
+        app.logger.info(f"Streamed {offset} predictions from {entry.name}:{entry.version}")
+        if not as_columnar:
+            yield json.dumps({
+                "done": True,
+                "n_samples": offset,
+                "used_features": required,
+                "model_name": entry.name,
+                "model_version": entry.version,
+            }) + "\n"
+
+    mimetype = columnar.CONTENT_TYPE if as_columnar else NDJSON_TYPES[0]
+    response = Response(stream_with_context(generate()), mimetype=mimetype, headers=model_headers(entry, required))
+    response.call_on_close(lambda: ADMISSION.release(admitted_rows))
+    return response
+
+
+@app.route("/predict_ensemble", methods=["POST"])
+def predict_ensemble():
+    """
+    Handles POST requests made to http://IP_ADDRESS:PORT/predict_ensemble
+
+    Scores the same shots with several models in one pass, e.g.
+    ?models=lr-angle,lr-distance,lr-both:v1 (version defaults to v1,
+    ?workspace= and ?project= apply to all of them). The body is the same as
+    for /predict and must hold the union of the models' features. Linear
+    models are stacked into one matrix multiply (see kernels.EnsembleKernel).
+
+    ?outputs= defaults to proba_goal. The JSON response maps each output to
+    {"<model>:<version>": values}; the columnar one has a
+    "<output>:<model>:<version>" column per model.
+    """
+    rejected = admit_early()
+    if rejected is not None:
+        return rejected
+
+    columns, log_message = read_columns()
+    if log_message:
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    rejected = admit(n_rows(columns))
+    if rejected is not None:
+        return rejected
 
-    X_model = X[required]
-    X_arr = X_model.values
+    specs = [m.strip() for m in request.args.get("models", "").split(",") if m.strip()]
+    if not specs:
+        log_message = "Missing required parameter: models"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    with g.timer.stage("validate"):
+        # deduplicated on the resolved keys: lr-distance and lr-distance:v1 are the same model
+        keys = dict.fromkeys(
+            (request.args.get("workspace", DEFAULT_WORKSPACE),
+             request.args.get("project", DEFAULT_PROJECT),
+             model_name,
+             version or DEFAULT_VERSION)
+            for model_name, _, version in (spec.partition(":") for spec in specs))
+        entries = []
+        for key in keys:
+            entry, log_message = resident_model(key)
+            if log_message:
+                app.logger.error(log_message)
+                return jsonify({"error": log_message})
+            if entry.features is None:
+                log_message = f"No feature list known for model {entry.name}"
+                app.logger.error(log_message)
+                return jsonify({"error": log_message})
+            entries.append(entry)
+
+        ensemble = EnsembleKernel([e.kernel for e in entries], [e.features for e in entries])
+        missing = [f for f in ensemble.features if f not in columns]
+        if missing:
+            log_message = f"Missing required features: {missing}"
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+
+        outputs, log_message = requested_outputs()
+        if log_message:
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+        outputs = outputs or ["proba_goal"]
+        X_arr = columnar.to_matrix(columns, ensemble.features)
 
     try:
-        y_proba = MODEL.predict_proba(X_arr).tolist()   
-        y_pred = MODEL.predict(X_arr).tolist()        
+        with g.timer.stage("inference"):
+            proba, pred = ensemble.score(X_arr)
     except Exception as e:
         log_message = f"Prediction failed: {e}"
         app.logger.error(log_message)
         return jsonify({"error": log_message})
 
-    app.logger.info(f"Predicted {len(y_pred)} shots.")
+    labels = [f"{e.name}:{e.version}" for e in entries]
+    for m, entry in enumerate(entries):
+        MODEL_REQUESTS.inc(model=entry.name, version=entry.version)
+        record_predictions(entry, request.endpoint, {f: columns[f] for f in entry.features}, proba[:, m], pred[:, m])
+    PREDICT_ROWS.observe(len(X_arr), endpoint=request.endpoint)
+    app.logger.info(f"Predicted {len(X_arr)} shots with {len(labels)} models: {labels}")
 
-    # Return response
+    with g.timer.stage("serialize"):
+        results = {
+            output: {label: output_column(output, pred[:, m], proba[:, m]) for m, label in enumerate(labels)}
+            for output in outputs
+        }
+        if wants_columnar():
+            body = columnar.encode_columns({
+                f"{output}:{label}": values
+                for output, by_model in results.items() for label, values in by_model.items()
+            })
+            headers = {"X-Models": ",".join(labels), "X-Used-Features": ",".join(ensemble.features)}
+            return Response(body, mimetype=columnar.CONTENT_TYPE, headers=headers)
 
-    response = {
-        "predictions": y_pred,
-        "probabilities": y_proba,
-        "n_samples": len(y_pred),
-        "used_features": required,
-        "model_name": CURRENT_MODEL_STRING,
-    }
+        response = {output: {label: values.tolist() for label, values in by_model.items()}
+                    for output, by_model in results.items()}
+        response.update({
+            "models": labels,
+            "n_samples": len(X_arr),
+            "used_features": ensemble.features,
+        })
+        return jsonify(response)
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Handles POST requests made to http://IP_ADDRESS:PORT/jobs
+
+    Queues an asynchronous bulk scoring job (see jobs.py) and returns its id
+    right away. Json schema expected:
+        {
+            input: (required) CSV or Parquet file, relative to SERVING_JOB_INPUT_DIR,
+            model: (optional) default: the current default model,
+            version, workspace, project: (optional),
+            outputs: (optional) list of outputs, default all of them
+        }
+    Follow the job with GET /jobs/<job_id>, fetch its results with
+    GET /jobs/<job_id>/result.
+    """
+    data = request.get_json(silent=True) or {}
+    app.logger.info(data)
+
+    if is_missing(data.get("input")):
+        log_message = "Missing required fields: input"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    if is_missing(data.get("model")):
+        key = REGISTRY.default_key
+        if key is None:
+            log_message = "No model loaded"
+            app.logger.error(log_message)
+            return jsonify({"error": log_message})
+    else:
+        key = (data.get("workspace", DEFAULT_WORKSPACE),
+               data.get("project", DEFAULT_PROJECT),
+               data.get("model"),
+               data.get("version", DEFAULT_VERSION))
+
+    outputs = data.get("outputs") or list(OUTPUTS)
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        log_message = f"Unknown outputs: {unknown}, expected some of {list(OUTPUTS)}"
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    try:
+        status = JOBS.submit(data["input"], key, outputs)
+    except ValueError as e:
+        log_message = str(e)
+        app.logger.error(log_message)
+        return jsonify({"error": log_message})
+
+    app.logger.info(f"Job {status['job_id']} queued: {data['input']} with {key[2]}:{key[3]}")
+    return jsonify(status)
+
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    """Most recent bulk scoring jobs (all workers), newest first."""
+    return jsonify({"jobs": JOBS.jobs()})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """State and progress (rows_done, parts) of a bulk scoring job."""
+    status = JOBS.status(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job {job_id}"})
+    return jsonify(status)
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """
+    Results of a finished job, streamed part by part from disk: CSV by
+    default (row = position in the input file, then the outputs), or
+    consecutive columnar frames when the Accept header asks for them.
+    """
+    status = JOBS.status(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job {job_id}"})
+    if status["state"] != "done":
+        return jsonify({"error": f"Job {job_id} is {status['state']}", "status": status})
+
+    parts = JOBS.parts(job_id)
+
+    if wants_columnar():
+        def frames():
+            for path in parts:
+                with open(path, "rb") as f:
+                    yield f.read()
+        return Response(frames(), mimetype=columnar.CONTENT_TYPE)
+
+    def rows():
+        for i, path in enumerate(parts):
+            with open(path, "rb") as f:
+                df = pd.DataFrame(columnar.decode_columns(f.read()))
+            df["row"] = df["row"].astype(np.int64)
+            if "prediction" in df:
+                df["prediction"] = df["prediction"].astype(np.int64)
+            yield df.to_csv(index=False, header=(i == 0))
+    return Response(rows(), mimetype="text/csv")
+
+
+def warm_up():
+    """
+    Run the /predict code path once on the default model (JSON parsing,
+    columnar codec, inference, serialization) before serving, so the first
+    real request does not pay for lazy imports and first-call initialization.
+    Done in the gunicorn master when preloaded, so every worker starts warm.
+    """
+    entry = REGISTRY.default()
+    if entry is None or not entry.features:
+        return
+    row = {f: {"0": 1.0} for f in entry.features}
+    X = pd.DataFrame(json.loads(json.dumps(row)))
+    columns = columnar.decode_columns(columnar.encode_columns({c: X[c].values for c in X.columns}))
+    p_goal, y_pred = run_model(entry.kernel, columnar.to_matrix(columns, entry.features))
+    prediction_frame(y_pred, p_goal)
+    with app.app_context():
+        jsonify(prediction_json(entry, y_pred, p_goal, entry.features))
+
+
+phase_started = time.perf_counter()
+warm_up()
+STARTUP["warm_up_sec"] = time.perf_counter() - phase_started
+STARTUP["total_sec"] = time.perf_counter() - IMPORT_STARTED
+app.logger.info("Startup: " + ", ".join(f"{k} {v:.3f}" for k, v in STARTUP.items()))
 
-    app.logger.info(response)
-    return (response)  # response must be json serializable!
 
 if __name__ == "__main__":
     app.run()
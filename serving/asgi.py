@@ -0,0 +1,241 @@
+"""
+ASGI entry point for the serving app.
+
+With sync gunicorn workers every connection holds a whole process while it
+uploads, waits for a model download or reads its response. Here /predict,
+/download_registry_model and /logs are async handlers: the event loop only
+does I/O, and the CPU-bound parts (decoding, inference, encoding) run in a
+bounded thread pool (SERVING_ASGI_CPU_THREADS), so one process can keep
+thousands of dashboard connections open. Every other route is served by
+the Flask app from app.py through a WSGI adapter, and both share the same
+model registry, loader, metrics and logs.
+
+If you are in the same directory as this file (asgi.py), run it with:
+
+    $ uvicorn asgi:app --host 0.0.0.0 --port <PORT>
+
+Note that `uvicorn --workers N` starts each worker from scratch (no
+preload), so the admission control counter is then per worker.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+
+import app as wsgi
+import columnar
+from admission import PRIORITIES
+from gzip_body import inflate
+from metrics import StageTimer
+
+CPU_THREADS = int(os.getenv("SERVING_ASGI_CPU_THREADS", "4"))
+CPU_POOL = ThreadPoolExecutor(CPU_THREADS, thread_name_prefix="asgi-cpu")
+
+logger = wsgi.app.logger
+
+
+async def run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(CPU_POOL, fn, *args)
+
+
+def error(log_message):
+    logger.error(log_message)
+    return JSONResponse({"error": log_message})
+
+
+def instrumented(endpoint):
+    """Record the request metrics of app.py (and the Server-Timing header) for a handler."""
+    def decorate(handler):
+        async def wrapper(request):
+            started = time.perf_counter()
+            request.state.timer = timer = StageTimer()
+            response = await handler(request)
+            elapsed = time.perf_counter() - started
+            wsgi.REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+            wsgi.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+            for name, seconds in timer.stages:
+                wsgi.STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=name)
+            timer.stages.append(("total", elapsed))
+            response.headers["Server-Timing"] = timer.server_timing()
+            return response
+        return wrapper
+    return decorate
+
+
+async def follow_pointer():
+    """app.follow_pointer without blocking the event loop while the swap finishes."""
+    key = wsgi.POINTER.changed()
+    if key is not None and key != wsgi.REGISTRY.default_key:
+        logger.info(f'Default model changed by another worker: {key[2]}:{key[3]}')
+        job = wsgi.LOADER.submit(key, make_default=True)
+        await asyncio.wait([asyncio.wrap_future(job.future)], timeout=wsgi.POINTER_SYNC_TIMEOUT)
+
+
+async def selected_model(args):
+    """app.selected_model, awaiting the load of a model that is not resident yet."""
+    key = wsgi.model_key(args)
+    if key is None:
+        key = wsgi.REGISTRY.default_key
+        entry = wsgi.REGISTRY.get(key) if key else None
+        if entry is None:
+            return None, "No model loaded"
+        return entry, None
+
+    entry = wsgi.REGISTRY.get(key)
+    if entry is not None:
+        return entry, None
+    try:
+        entry = await asyncio.wrap_future(wsgi.LOADER.submit(key).future)
+    except Exception as e:
+        return None, str(e)
+    return entry, None
+
+
+def shed(priority, retry_after, log_message):
+    """app.shed for /predict: the 429 (bulk) / 503 response, with a Retry-After header."""
+    wsgi.SHED_REQUESTS.inc(endpoint="predict", priority=priority)
+    logger.warning(log_message)
+    return JSONResponse({"error": log_message, "retry_after": retry_after},
+                        status_code=429 if priority == "bulk" else 503,
+                        headers={"Retry-After": str(int(retry_after))})
+
+
+@instrumented("predict")
+async def predict(request):
+    """Same contract as app.predict (JSON or columnar, ?model=, ?outputs=, X-Priority)."""
+    timer = request.state.timer
+    await follow_pointer()
+
+    priority = request.headers.get("x-priority", "normal").strip().lower()
+    if priority not in PRIORITIES:
+        priority = "normal"
+    # before reading the body: a request over its priority's limit is refused without the upload
+    retry_after = wsgi.ADMISSION.check(priority)
+    if retry_after is not None:
+        return shed(priority, retry_after, f"Overloaded: {wsgi.ADMISSION.in_flight()} rows in flight, "
+                                           f"{priority} request refused before reading it")
+
+    body = await request.body()
+    if request.headers.get("content-encoding", "").strip().lower() == "gzip":
+        try:
+            body = await run_cpu(inflate, body, int(wsgi.MAX_INFLATED_MB * 1024 * 1024))
+        except HTTPException as e:
+            logger.error(e.description)
+            return JSONResponse({"error": e.description}, status_code=e.code)
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        with timer.stage("parse"):
+            columns = await run_cpu(wsgi.parse_body, mimetype, body)
+    except ValueError as e:
+        return error(str(e))
+
+    rows = wsgi.n_rows(columns)
+    if wsgi.ADMISSION.defer and priority == "bulk":
+        # blocks until rows are admitted: waited out on the default executor, not the CPU pool
+        retry_after = await asyncio.get_running_loop().run_in_executor(None, wsgi.ADMISSION.acquire, rows, priority)
+    else:
+        retry_after = wsgi.ADMISSION.acquire(rows, priority)
+    if retry_after is not None:
+        return shed(priority, retry_after,
+                    f"Overloaded: {wsgi.ADMISSION.in_flight()} rows in flight, {priority} request of {rows} rows refused")
+
+    try:
+        with timer.stage("validate"):
+            entry, log_message = await selected_model(request.query_params)
+            if log_message:
+                return error(log_message)
+            required = entry.features
+            if required is None:
+                return error(f"No feature list known for model {entry.name}")
+            missing = [f for f in required if f not in columns]
+            if missing:
+                return error(f"Missing required features: {missing}")
+            outputs, log_message = wsgi.parse_outputs(request.query_params.get("outputs"))
+            if log_message:
+                return error(log_message)
+            X_arr = columnar.to_matrix(columns, required)
+
+        score = wsgi.BATCHER.submit if wsgi.BATCHER is not None else wsgi.run_model
+        try:
+            with timer.stage("inference"):
+                p_goal, y_pred = await run_cpu(score, entry.kernel, X_arr)
+        except Exception as e:
+            return error(f"Prediction failed: {e}")
+    finally:
+        wsgi.ADMISSION.release(rows)
+
+    wsgi.MODEL_REQUESTS.inc(model=entry.name, version=entry.version)
+    wsgi.PREDICT_ROWS.observe(len(y_pred), endpoint="predict")
+    wsgi.record_predictions(entry, "predict", {f: columns[f] for f in required}, p_goal, y_pred)
+    logger.info(f"Returning {len(y_pred)} predictions from {entry.name}:{entry.version}")
+
+    accept = request.headers.get("accept", "")
+    with timer.stage("serialize"):
+        if columnar.CONTENT_TYPE in accept:
+            body = await run_cpu(wsgi.prediction_frame, y_pred, p_goal, outputs)
+            return Response(body, media_type=columnar.CONTENT_TYPE, headers=wsgi.model_headers(entry, required))
+        response = wsgi.prediction_json(entry, y_pred, p_goal, required, outputs)
+        body = await run_cpu(json.dumps, response)
+    return Response(body, media_type="application/json")
+
+
+@instrumented("download_registry_model")
+async def download_registry_model(request):
+    """Same contract as app.download_registry_model; wait=true awaits the swap without holding a worker."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return error("No data received")
+    logger.info(data)
+
+    required = ["workspace", "project", "model", "version"]
+    missing = [key for key in required if wsgi.is_missing(data.get(key))]
+    if missing:
+        return error(f"Missing required fields: {', '.join(missing)}")
+
+    key = (data["workspace"], data["project"], data["model"], data["version"])
+    job = wsgi.request_swap(key)
+    if data.get("wait"):
+        try:
+            await asyncio.wrap_future(job.future)
+        except Exception as e:
+            return error(str(e))
+        log_message = f'Model {key[2]} is loaded'
+        logger.info(log_message)
+        return JSONResponse({"info": log_message})
+
+    log_message = f'Swap to model {key[2]}:{key[3]} started'
+    logger.info(log_message)
+    return JSONResponse({"info": log_message, "status": job.describe()})
+
+
+@instrumented("logs")
+async def logs(request):
+    """Same as app.logs: the last log lines of this worker."""
+    N = 100
+    response = [line.strip() for line in wsgi.LOG_BUFFER.tail(N)]
+    return JSONResponse({"Flask logs": response})
+
+
+def flask_app(environ, start_response):
+    # a2wsgi's wsgi.input ends with the body, chunked uploads included (as with gunicorn)
+    environ.setdefault("wsgi.input_terminated", True)
+    return wsgi.app(environ, start_response)
+
+
+app = Starlette(routes=[
+    Route("/predict", predict, methods=["POST"]),
+    Route("/download_registry_model", download_registry_model, methods=["POST"]),
+    Route("/logs", logs, methods=["GET"]),
+    # everything else (/metrics, /models, /predict_stream, /jobs, ...) is the Flask app
+    Mount("/", app=WSGIMiddleware(flask_app)),
+])
@@ -0,0 +1,26 @@
+"""
+Atomic file replacement, for files read by other workers while they are
+rewritten (the model pointer, job status and result files).
+"""
+
+from __future__ import annotations
+import os
+import tempfile
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Replace path with data: the content is written to a temp file in the same
+    directory, then renamed over path, so a reader sees the old or the new
+    file, never a partial one. Temp files start with "." and are removed on error.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,241 @@
+"""
+Write-behind audit log of the predictions served.
+
+Every scored row (its model inputs, the model name and version, proba_goal,
+prediction and a timestamp) is kept for drift analysis, without putting
+the disk on the request path: record() only samples the rows and appends
+them to an in-memory buffer, and a background thread flushes the buffer
+every flush_seconds (or as soon as it holds flush_rows rows) to columnar
+files. When the disk cannot keep up the buffer is capped at max_bytes and
+new rows are dropped (and counted) rather than making requests wait, as
+for the logs (see log_buffer.py).
+
+Files are written per model version and endpoint, under
+<root>/<model>:<version>/<endpoint>-<UTC time>-<pid>-<n>.xgc, and rotated
+after rotate_rows rows or rotate_seconds. A file is named *.part until it
+is closed. pyarrow is not in requirements.txt, so by default the files are
+consecutive XGC1 columnar frames (the format of columnar.py), read with:
+
+    with open(path, "rb") as f:
+        df = pd.concat(pd.DataFrame(c) for c in columnar.read_frames(f))
+
+When pyarrow is installed they are Parquet (*.parquet) instead.
+"""
+
+from __future__ import annotations
+import atexit
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+import columnar
+
+logger = logging.getLogger(__name__)
+
+# (model, version, endpoint, input column names): the rows of one file stream
+StreamKey = Tuple[str, str, str, Tuple[str, ...]]
+_FILE_SEQ = itertools.count()
+
+
+def default_format() -> str:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return "xgc"
+    return "parquet"
+
+
+class _ParquetFile:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+
+    def write(self, columns: Dict[str, np.ndarray]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table(columns)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _FrameFile:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab")
+
+    def write(self, columns: Dict[str, np.ndarray]) -> None:
+        self._file.write(columnar.encode_columns(columns))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _Stream:
+    """The open file of one StreamKey."""
+
+    def __init__(self, folder: str, endpoint: str, fmt: str):
+        os.makedirs(folder, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        suffix = ".parquet" if fmt == "parquet" else ".xgc"
+        self.path = os.path.join(folder, f"{endpoint}-{stamp}-{os.getpid()}-{next(_FILE_SEQ)}{suffix}")
+        self.file = (_ParquetFile if fmt == "parquet" else _FrameFile)(f"{self.path}.part")
+        self.rows = 0
+        self.opened = time.monotonic()
+
+    def close(self) -> None:
+        self.file.close()
+        if os.path.exists(self.file.path):
+            os.replace(self.file.path, self.path)
+
+
+class AuditLog:
+
+    def __init__(self, root: str, sample_rate: float = 1.0, flush_rows: int = 10000,
+                 flush_seconds: float = 5.0, max_bytes: int = 64 * 1024 * 1024,
+                 rotate_rows: int = 1000000, rotate_seconds: float = 3600.0, fmt: Optional[str] = None):
+        self.root = root
+        self.sample_rate = sample_rate
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.format = fmt or default_format()
+        self.dropped = 0
+        self.written = 0
+        self._pending: deque = deque()
+        self._pending_rows = 0
+        self._pending_bytes = 0
+        self._streams: Dict[StreamKey, _Stream] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def buffered_bytes(self) -> int:
+        return self._pending_bytes
+
+    def _ensure_writer(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # buffers and open files inherited through fork belong to the parent
+                self._pending = deque()
+                self._pending_rows = self._pending_bytes = 0
+                self._streams = {}
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="audit-writer", daemon=True).start()
+                atexit.register(self.close)
+
+    def record(self, model: str, version: str, endpoint: str, inputs: Mapping[str, Any],
+               p_goal: np.ndarray, y_pred: np.ndarray) -> None:
+        """Queue the rows of one scored batch (sampled at sample_rate). Never blocks on the disk."""
+        n = len(p_goal)
+        if not self.enabled or n == 0:
+            return
+        columns = {name: np.asarray(v, dtype=float) for name, v in inputs.items()}
+        columns["proba_goal"] = np.asarray(p_goal, dtype=float)
+        columns["prediction"] = np.asarray(y_pred, dtype=np.int64)
+        if self.sample_rate < 1.0:
+            keep = np.random.random_sample(n) < self.sample_rate
+            if not keep.any():
+                return
+            columns = {name: v[keep] for name, v in columns.items()}
+            n = int(keep.sum())
+        columns = {"timestamp": np.full(n, time.time()), **columns}
+        nbytes = sum(v.nbytes for v in columns.values())
+
+        self._ensure_writer()
+        key = (model, version, endpoint, tuple(inputs))
+        with self._lock:
+            if self._pending_bytes + nbytes > self.max_bytes:
+                self.dropped += n
+                return
+            self._pending.append((key, columns))
+            self._pending_rows += n
+            self._pending_bytes += nbytes
+            full = self._pending_rows >= self.flush_rows
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit log flush failed: {e}")
+
+    def flush(self) -> None:
+        """Write the buffered rows (one write per stream) and rotate the files that are due."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, deque()
+                self._pending_rows = 0
+            # the rows being written still count against max_bytes until they are on disk
+            taken = sum(v.nbytes for _, columns in pending for v in columns.values())
+
+            batches: Dict[StreamKey, list] = {}
+            for key, columns in pending:
+                batches.setdefault(key, []).append(columns)
+            for key, parts in batches.items():
+                columns = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+                n = len(columns["timestamp"])
+                try:
+                    stream = self._stream(key)
+                    stream.file.write(columns)
+                    stream.rows += n
+                    self.written += n
+                except Exception as e:
+                    self.dropped += n
+                    logger.error(f"Audit log: {n} rows of {key[0]}:{key[1]} lost: {e}")
+            with self._lock:
+                self._pending_bytes -= taken
+
+            now = time.monotonic()
+            for key, stream in list(self._streams.items()):
+                if stream.rows >= self.rotate_rows or now - stream.opened >= self.rotate_seconds:
+                    self._close_stream(key)
+
+    def _stream(self, key: StreamKey) -> _Stream:
+        stream = self._streams.get(key)
+        if stream is None:
+            model, version, endpoint, _ = key
+            folder = os.path.join(self.root, f"{model}:{version}")
+            stream = self._streams[key] = _Stream(folder, endpoint, self.format)
+        return stream
+
+    def _close_stream(self, key: StreamKey) -> None:
+        stream = self._streams.pop(key)
+        try:
+            stream.close()
+        except Exception as e:
+            logger.error(f"Audit log: could not close {stream.path}: {e}")
+
+    def close(self) -> None:
+        """Flush and close every open file (at exit)."""
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        with self._flush_lock:
+            for key in list(self._streams):
+                self._close_stream(key)
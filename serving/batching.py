@@ -0,0 +1,172 @@
+"""
+Micro-batching for /predict.
+
+With threaded gunicorn workers (e.g. `gunicorn --threads 8 app:app`) several
+/predict calls can be in flight in the same process. Instead of each one
+running the model on a handful of rows, they hand their matrix to a
+MicroBatcher, which gathers requests for the same model over a short window
+(or until max_batch_rows), runs a single vectorized inference and scatters
+the result slices back to the waiting callers.
+
+The window is adaptive: when a batch closes with a single request (no
+concurrency) the next window is halved, so a quiet server adds almost no
+latency; as soon as requests pile up again it goes back to the configured
+maximum.
+"""
+
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+# rows-per-batch histogram buckets exposed by stats()
+BATCH_SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096)
+
+
+class _Pending:
+    __slots__ = ("model", "X", "enqueued", "done", "result", "error")
+
+    def __init__(self, model: Any, X: np.ndarray):
+        self.model = model
+        self.X = X
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent inference calls.
+
+    infer_fn(model, X) must return a tuple of arrays whose first axis is
+    aligned with the rows of X, e.g. (proba_goal, prediction).
+    """
+
+    def __init__(self, infer_fn: Callable[[Any, np.ndarray], Tuple[np.ndarray, ...]],
+                 window_ms: float = 2.0, max_batch_rows: int = 1024):
+        self.infer_fn = infer_fn
+        self.max_window = window_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self._window = self.max_window
+
+        self._cond = threading.Condition()
+        self._queue: List[_Pending] = []
+        self._queued_rows = 0
+        self._thread = None
+        self._pid = None
+
+        self._n_requests = 0
+        self._n_served = 0
+        self._n_batches = 0
+        self._n_rows = 0
+        self._max_queue_depth = 0
+        self._max_batch_rows_seen = 0
+        self._queue_wait_total = 0.0
+        self._size_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, model: Any, X: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Queue X for model and block until its slice of the batch result is ready."""
+        item = _Pending(model, X)
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(item)
+            self._queued_rows += len(X)
+            self._n_requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._cond.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _take_batch(self) -> List[_Pending]:
+        """Wait for work, then for the window to close; return requests for one model."""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued + self._window
+            while self._queued_rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            model = self._queue[0].model
+            batch, rest, rows = [], [], 0
+            for item in self._queue:
+                if item.model is model and (not batch or rows + len(item.X) <= self.max_batch_rows):
+                    batch.append(item)
+                    rows += len(item.X)
+                else:
+                    rest.append(item)
+            self._queue = rest
+            self._queued_rows -= rows
+
+            if len(batch) > 1:
+                self._window = self.max_window
+            else:
+                self._window = self._window / 2 if self._window > 1e-4 else 0.0
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            try:
+                X = batch[0].X if len(batch) == 1 else np.concatenate([item.X for item in batch])
+                outputs = self.infer_fn(batch[0].model, X)
+                start = 0
+                for item in batch:
+                    stop = start + len(item.X)
+                    item.result = tuple(out[start:stop] for out in outputs)
+                    start = stop
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            finally:
+                for item in batch:
+                    item.done.set()
+            self._record(batch, started)
+
+    def _record(self, batch: List[_Pending], started: float) -> None:
+        rows = sum(len(item.X) for item in batch)
+        with self._cond:
+            self._n_batches += 1
+            self._n_served += len(batch)
+            self._n_rows += rows
+            self._max_batch_rows_seen = max(self._max_batch_rows_seen, rows)
+            self._queue_wait_total += sum(started - item.enqueued for item in batch)
+            bucket = next((i for i, b in enumerate(BATCH_SIZE_BUCKETS) if rows <= b), len(BATCH_SIZE_BUCKETS))
+            self._size_hist[bucket] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                "pid": os.getpid(),
+                "window_ms": self._window * 1000.0,
+                "max_window_ms": self.max_window * 1000.0,
+                "max_batch_rows": self.max_batch_rows,
+                "queue_depth": len(self._queue),
+                "queued_rows": self._queued_rows,
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._n_requests,
+                "batches": self._n_batches,
+                "rows": self._n_rows,
+                "mean_requests_per_batch": self._n_served / self._n_batches if self._n_batches else 0.0,
+                "mean_batch_rows": self._n_rows / self._n_batches if self._n_batches else 0.0,
+                "max_batch_rows_seen": self._max_batch_rows_seen,
+                "mean_queue_wait_ms": 1000.0 * self._queue_wait_total / self._n_served if self._n_served else 0.0,
+                "batch_rows_histogram": dict(zip(labels, self._size_hist)),
+            }
@@ -0,0 +1,326 @@
+"""
+Streaming drift sketches of the model inputs, kept inside the serving app.
+
+For each resident model, every scored batch updates one FeatureSketch per
+feature (and one for proba_goal), in constant memory and with a few NumPy
+calls per batch whatever its size:
+
+    histogram   counts over fixed bin edges (plus under/overflow bins)
+    quantiles   a KLL-style compactor sketch (k items per level)
+    moments     count, missing, min, max, running mean and variance
+
+/drift compares them with the reference profile of the model version, the
+same sketches computed on its training data and stored next to its artifact
+as <model>.profile.json: the population stability index (PSI) and the
+Kolmogorov-Smirnov distance, both over the reference's bins. Sketches are
+per worker (like /logs), since they are updated by its requests only.
+
+Build a reference profile from the training features (CSV or Parquet),
+e.g. from ./serving:
+
+    $ python drift.py ../data/train.csv --model lr-distance --version v1
+
+No profile ships with the bundled lr-distance:v1 (the training data is not
+in the repository): until one is built, /drift reports its live sketches
+only, without PSI or KS.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMAT = "xg-profile/1"
+PROFILE_SUFFIX = ".profile.json"
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# bins of the histograms when there is no reference profile to take them from
+DEFAULT_EDGES = {
+    "distance_from_net": np.arange(0.0, 201.0, 5.0),
+    "shot_angle": np.arange(0.0, 91.0, 3.0),
+    "empty_net": np.array([0.5]),
+    "proba_goal": np.linspace(0.0, 1.0, 51),
+}
+# usual reading of the PSI: under 0.1 stable, 0.1-0.25 moderate shift, above significant
+PSI_LEVELS = ((0.1, "stable"), (0.25, "moderate"))
+
+
+def profile_path(artifact_dir: str, model_name: str, version: str) -> str:
+    return f"{artifact_dir}/{model_name}:{version}/{model_name}{PROFILE_SUFFIX}"
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles in O(k log(n / k)) memory. Level h holds items that
+    each stand for 2**h values; a full level is sorted and every other item
+    (from a random offset) is promoted to the next level.
+    """
+
+    def __init__(self, k: int = 256, seed: int = 0):
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, x: np.ndarray) -> None:
+        self.levels[0] = np.concatenate([self.levels[0], x])
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # an odd item out stays at this level
+                keep, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[h] = keep
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def quantiles(self, qs: Sequence[float]) -> Optional[List[float]]:
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return None
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side="left")
+        return items[np.minimum(idx, len(items) - 1)].tolist()
+
+
+class FeatureSketch:
+
+    def __init__(self, edges: Optional[np.ndarray] = None, k: int = 256):
+        self.edges = None if edges is None else np.asarray(edges, dtype=float)
+        # counts[0] is below edges[0], counts[-1] at or above edges[-1]
+        self.counts = None if self.edges is None else np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.quantile_sketch = QuantileSketch(k)
+        self.n = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: Any) -> None:
+        x = np.asarray(values, dtype=float).reshape(-1)
+        nan = np.isnan(x)
+        if nan.any():
+            self.missing += int(nan.sum())
+            x = x[~nan]
+        n_b = len(x)
+        if n_b == 0:
+            return
+        if self.counts is not None:
+            self.counts += np.bincount(np.searchsorted(self.edges, x, side="right"), minlength=len(self.counts))
+        self.quantile_sketch.update(x)
+
+        # running mean / variance, merging the batch's moments (Chan et al.)
+        mean_b = float(x.mean())
+        m2_b = float(((x - mean_b) ** 2).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+
+    def summary(self, histogram: bool = False) -> Dict[str, Any]:
+        quantiles = self.quantile_sketch.quantiles(QUANTILES)
+        summary = {
+            "count": self.n,
+            "missing": self.missing,
+            "mean": self.mean if self.n else None,
+            "std": float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else None,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            "quantiles": None if quantiles is None else {str(q): v for q, v in zip(QUANTILES, quantiles)},
+        }
+        if histogram and self.counts is not None:
+            summary["histogram"] = {"edges": self.edges.tolist(), "counts": self.counts.tolist()}
+        return summary
+
+
+def psi(reference: np.ndarray, live: np.ndarray, eps: float = 1e-4) -> float:
+    """Population stability index between two histograms over the same bins."""
+    p = np.maximum(reference / max(reference.sum(), 1), eps)
+    q = np.maximum(live / max(live.sum(), 1), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks(reference: np.ndarray, live: np.ndarray) -> float:
+    """Kolmogorov-Smirnov distance between two histograms, evaluated at their bin edges."""
+    cdf_ref = np.cumsum(reference) / max(reference.sum(), 1)
+    cdf_live = np.cumsum(live) / max(live.sum(), 1)
+    return float(np.max(np.abs(cdf_ref - cdf_live)))
+
+
+def psi_level(value: float) -> str:
+    for limit, level in PSI_LEVELS:
+        if value < limit:
+            return level
+    return "significant"
+
+
+class ModelDrift:
+    """Sketches of one model version, with its reference profile if it has one."""
+
+    def __init__(self, features: Sequence[str], reference: Optional[Dict[str, Any]] = None):
+        self.reference = reference
+        ref_features = (reference or {}).get("features", {})
+        self.sketches: Dict[str, FeatureSketch] = {}
+        for name in [*features, "proba_goal"]:
+            if name in ref_features and ref_features[name].get("histogram"):
+                edges = ref_features[name]["histogram"]["edges"]
+            else:
+                edges = DEFAULT_EDGES.get(name)
+            self.sketches[name] = FeatureSketch(edges)
+        self._lock = threading.Lock()
+
+    def update(self, columns: Mapping[str, Any]) -> None:
+        with self._lock:
+            for name, sketch in self.sketches.items():
+                if name in columns:
+                    sketch.update(columns[name])
+
+    def report(self, histograms: bool = False) -> Dict[str, Any]:
+        ref_features = (self.reference or {}).get("features", {})
+        features = {}
+        with self._lock:
+            for name, sketch in self.sketches.items():
+                summary = sketch.summary(histograms)
+                ref = ref_features.get(name)
+                if ref is not None:
+                    summary["reference"] = {k: ref.get(k) for k in ("count", "mean", "std", "quantiles")}
+                    ref_hist = ref.get("histogram")
+                    if ref_hist and sketch.counts is not None and sketch.n:
+                        ref_counts = np.asarray(ref_hist["counts"], dtype=float)
+                        summary["psi"] = psi(ref_counts, sketch.counts)
+                        summary["psi_level"] = psi_level(summary["psi"])
+                        summary["ks"] = ks(ref_counts, sketch.counts)
+                features[name] = summary
+        return {
+            "rows": self.sketches["proba_goal"].n,
+            "reference": None if self.reference is None else self.reference.get("source"),
+            "features": features,
+        }
+
+
+class DriftMonitor:
+    """One ModelDrift per model version, created on its first scored batch."""
+
+    def __init__(self, artifact_dir: str):
+        self.artifact_dir = artifact_dir
+        self._models: Dict[tuple, ModelDrift] = {}
+        self._lock = threading.Lock()
+
+    def load_reference(self, model_name: str, version: str) -> Optional[Dict[str, Any]]:
+        path = profile_path(self.artifact_dir, model_name, version)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            profile = json.load(f)
+        if profile.get("format") != PROFILE_FORMAT:
+            raise ValueError(f"{path}: unknown format {profile.get('format')!r}, expected {PROFILE_FORMAT!r}")
+        return profile
+
+    def model(self, model_name: str, version: str, features: Sequence[str]) -> ModelDrift:
+        key = (model_name, version)
+        drift = self._models.get(key)
+        if drift is None:
+            with self._lock:
+                drift = self._models.get(key)
+                if drift is None:
+                    try:
+                        reference = self.load_reference(model_name, version)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Drift reference of {model_name}:{version} not used: {e}")
+                        reference = None
+                    drift = self._models[key] = ModelDrift(features, reference)
+        return drift
+
+    def update(self, model_name: str, version: str, features: Sequence[str],
+               inputs: Mapping[str, Any], p_goal: np.ndarray) -> None:
+        self.model(model_name, version, features).update({**inputs, "proba_goal": p_goal})
+
+    def report(self, model_name: Optional[str] = None, version: Optional[str] = None,
+               histograms: bool = False) -> Dict[str, Any]:
+        """{"<model>:<version>": report} of the tracked models, optionally only one name/version."""
+        return {
+            f"{name}:{ver}": drift.report(histograms)
+            for (name, ver), drift in list(self._models.items())
+            if (model_name is None or name == model_name) and (version is None or ver == version)
+        }
+
+
+def build_profile(path: str, features: Sequence[str], kernel: Any = None,
+                  shard_rows: int = 100000) -> Dict[str, Any]:
+    """Reference profile of the feature columns of a CSV/Parquet file (and proba_goal if a kernel is given)."""
+    from jobs import iter_shards
+
+    features = list(features)
+    sketches = {}
+    for shard in iter_shards(path, features, shard_rows):
+        if not sketches:
+            for name in features:
+                edges = DEFAULT_EDGES.get(name)
+                if edges is None:
+                    # bins at the deciles of the first shard for features without default bins
+                    values = shard[name].to_numpy(dtype=float)
+                    edges = np.unique(np.nanquantile(values, np.linspace(0, 1, 11)))
+                sketches[name] = FeatureSketch(edges)
+            if kernel is not None:
+                sketches["proba_goal"] = FeatureSketch(DEFAULT_EDGES["proba_goal"])
+        for name in features:
+            sketches[name].update(shard[name].to_numpy(dtype=float))
+        if kernel is not None:
+            p_goal, _ = kernel.score(shard[features].to_numpy(dtype=float))
+            sketches["proba_goal"].update(p_goal)
+
+    return {
+        "format": PROFILE_FORMAT,
+        "source": os.path.basename(path),
+        "features": {name: sketch.summary(histogram=True) for name, sketch in sketches.items()},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the drift reference profile of a model version.")
+    parser.add_argument("data_path", help="training features, CSV or Parquet")
+    parser.add_argument("--model", required=True, help="e.g. lr-distance")
+    parser.add_argument("--version", default="v1")
+    parser.add_argument("--features", nargs="+", help="default: the model's feature list")
+    parser.add_argument("--artifact-dir", default="../artifacts")
+    args = parser.parse_args(argv)
+
+    import portable
+    from registry import MODEL_FEATURES
+
+    # proba_goal is profiled too when the model has a portable artifact (no sklearn needed)
+    kernel, features = None, args.features or MODEL_FEATURES.get(args.model)
+    linear_path = portable.artifact_path(args.artifact_dir, args.model, args.version)
+    if os.path.exists(linear_path):
+        kernel, linear_features, _ = portable.load_linear(linear_path)
+        if args.features and list(args.features) != linear_features:
+            kernel = None
+        features = features or linear_features
+    if not features:
+        parser.error(f"no feature list known for {args.model}, pass --features")
+
+    profile = build_profile(args.data_path, features, kernel)
+    output = profile_path(args.artifact_dir, args.model, args.version)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Wrote {output} ({profile['features'][features[0]]['count']} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Vectorized shot features, mirroring FeatureEngineering in
+scripts/step1_data/feature_engineering_milestone_3.py with plain NumPy arrays
+(no DataFrame round trip) so the serving app can derive model inputs from raw
+NHL event fields.
+"""
+
+from __future__ import annotations
+from typing import Dict, Tuple
+
+import numpy as np
+
+NET_X = 89
+# features event_features() derives from raw events
+EVENT_FEATURES = ("distance_from_net", "shot_angle", "empty_net")
+
+
+def assign_net(period: np.ndarray, home: np.ndarray) -> np.ndarray:
+    """x coordinate of the net for each shot, from the period and the shooter's side."""
+    odd_period = np.asarray(period, dtype=float) % 2 == 1
+    home = np.asarray(home).astype(bool)
+    home_def_x = np.where(odd_period, NET_X, -NET_X)
+    return np.where(home, home_def_x, -home_def_x)
+
+
+def shot_geometry(x: np.ndarray, y: np.ndarray, net_x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(distance_from_net, shot_angle) of each shot relative to net_x."""
+    dx = net_x - np.asarray(x, dtype=float)
+    dy = -np.asarray(y, dtype=float)
+    dist = np.sqrt(dx ** 2 + dy ** 2)
+    angle = np.degrees(np.arctan2(np.abs(dy), np.abs(dx)))
+    return dist, angle
+
+
+def target_net(x: np.ndarray, y: np.ndarray, period: np.ndarray, home: np.ndarray) -> np.ndarray:
+    """
+    Same rule as FeatureEngineering.calculate_distance_from_net: nets come from
+    assign_net, and the whole batch is flipped when its median distance is over 80 ft
+    (the feed reports coordinates from the other end).
+    """
+    net_x = assign_net(period, home)
+    dist, _ = shot_geometry(x, y, net_x)
+    if len(dist) and np.nanmedian(dist) > 80:
+        net_x = -net_x
+    return net_x
+
+
+def empty_net(situation_code: np.ndarray, home: np.ndarray) -> np.ndarray:
+    """
+    1 when the defending net is empty. situationCode is "<away goalie><away skaters>
+    <home skaters><home goalie>"; it may arrive as a string or, after a JSON/columnar
+    round trip, as a number that lost its leading zero (651 is "0651").
+    """
+    home = np.asarray(home).astype(bool)
+    codes = np.asarray(situation_code)
+    if codes.dtype.kind in "iuf":
+        codes = codes.astype(float)
+        valid = ~np.isnan(codes)
+        as_int = np.where(valid, codes, 0).astype(np.int64)
+        first_zero = valid & (as_int // 1000 == 0)
+        last_zero = valid & (as_int % 10 == 0)
+    else:
+        codes = codes.astype(str)
+        first_zero = np.char.startswith(codes, "0")
+        last_zero = np.char.endswith(codes, "0")
+    return ((last_zero & ~home) | (first_zero & home)).astype(np.int64)
+
+
+def event_features(x: np.ndarray, y: np.ndarray, period: np.ndarray, home: np.ndarray,
+                   situation_code: np.ndarray) -> Dict[str, np.ndarray]:
+    """distance_from_net, shot_angle and empty_net (plus the attacked net_x) of a batch of raw shot events."""
+    net_x = target_net(x, y, period, home)
+    dist, angle = shot_geometry(x, y, net_x)
+    return {
+        "distance_from_net": dist,
+        "shot_angle": angle,
+        "empty_net": empty_net(situation_code, home),
+        "net_x": net_x,
+    }
@@ -0,0 +1,72 @@
+"""
+Rink-grid lookup tables.
+
+The served models only see distance_from_net / shot_angle, which are pure
+functions of the integer rink coordinates (x in [-100, 100], y in [-42, 42])
+and of which net is attacked. The geometry is mirror-symmetric (net at -89 is
+net at +89 with x negated), so one 201 x 85 table per model covers the whole
+input space. It is filled once when the model is loaded; scoring raw
+coordinates is then an array gather, and only off-grid rows (non-integer or
+out-of-rink coordinates) go through the model's kernel (see kernels.py).
+"""
+
+from __future__ import annotations
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from features import NET_X, shot_geometry
+
+X_MIN, X_MAX = -100, 100
+Y_MIN, Y_MAX = -42, 42
+
+
+class GridTable:
+
+    def __init__(self, kernel: Any, required: List[str]):
+        self.required = list(required)
+        xs = np.arange(X_MIN, X_MAX + 1)
+        ys = np.arange(Y_MIN, Y_MAX + 1)
+        gx, gy = np.meshgrid(xs, ys, indexing="ij")
+        X = self.design_matrix(gx.ravel(), gy.ravel(), np.full(gx.size, NET_X))
+
+        shape = (len(xs), len(ys))
+        proba, pred = kernel.score(X)
+        self.proba = proba.reshape(shape)
+        self.pred = pred.reshape(shape)
+
+    def design_matrix(self, x: np.ndarray, y: np.ndarray, net_x: np.ndarray) -> np.ndarray:
+        dist, angle = shot_geometry(x, y, net_x)
+        geometry = {"distance_from_net": dist, "shot_angle": angle}
+        return np.column_stack([geometry[f] for f in self.required])
+
+    def lookup(self, kernel: Any, x: np.ndarray, y: np.ndarray, net_x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Score shots given raw coordinates and the attacked net.
+
+        Returns (goal probabilities, predictions, n_rows_served_from_the_table).
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        net_x = np.asarray(net_x)
+        # mirror shots on the -89 net onto the +89 half of the table
+        x_mirrored = np.where(net_x > 0, x, -x)
+
+        on_grid = (
+            (x_mirrored == np.round(x_mirrored)) & (y == np.round(y))
+            & (x_mirrored >= X_MIN) & (x_mirrored <= X_MAX)
+            & (y >= Y_MIN) & (y <= Y_MAX)
+            & (np.abs(net_x) == NET_X)
+        )
+        ix = np.where(on_grid, x_mirrored, X_MIN).astype(np.intp) - X_MIN
+        iy = np.where(on_grid, y, Y_MIN).astype(np.intp) - Y_MIN
+
+        proba = self.proba[ix, iy]
+        pred = self.pred[ix, iy]
+
+        off_grid = ~on_grid
+        if off_grid.any():
+            X = self.design_matrix(x[off_grid], y[off_grid], net_x[off_grid])
+            proba[off_grid], pred[off_grid] = kernel.score(X)
+
+        return proba, pred, int(on_grid.sum())
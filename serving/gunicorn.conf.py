@@ -0,0 +1,59 @@
+"""
+gunicorn settings for the serving container. From ./serving:
+
+    $ gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) so the default model is
+loaded before fork and its pages are shared copy-on-write by all workers.
+Later swaps are propagated between workers through the model pointer file
+(see model_pointer.py).
+
+Threads and pools do not survive fork: the ones started in the master do not
+exist in the workers. The background threads and pools of the app (log
+listener, micro-batcher, model loader, job pools, audit writer) are therefore
+started lazily on first use and restarted when the pid changes.
+
+Each worker keeps its own metrics; they are summed by /metrics through
+snapshot files in SERVING_METRICS_DIR (see metrics.py), a fresh temporary
+directory per server unless set.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('SERVING_PORT', '5000')}"
+workers = int(os.getenv("SERVING_WORKERS", "2"))
+threads = int(os.getenv("SERVING_THREADS", "1"))
+preload_app = True
+
+# set here, before the app is imported, so the master and every worker share it
+if not os.getenv("SERVING_METRICS_DIR"):
+    os.environ["SERVING_METRICS_DIR"] = tempfile.mkdtemp(prefix="serving-metrics-")
+    _own_metrics_dir = True
+else:
+    _own_metrics_dir = False
+
+
+def post_worker_init(worker):
+    # warm each worker once more after fork, so the copy-on-write page faults
+    # and per-process first-call costs are paid here and not by the first request
+    import app
+    app.warm_up()
+
+
+def pre_fork(server, worker):
+    # metrics observed in the master (e.g. the preloaded model's load time) are
+    # reported from its snapshot; the worker starts from zero (see metrics.py)
+    import app
+    app.METRICS.flush()
+
+
+def child_exit(server, worker):
+    # a worker killed mid-request (timeout, SIGKILL) never released its admitted rows
+    import app
+    app.ADMISSION.forget(worker.pid)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ["SERVING_METRICS_DIR"], ignore_errors=True)
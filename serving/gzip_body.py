@@ -0,0 +1,79 @@
+"""
+gzip-compressed request bodies (Content-Encoding: gzip).
+
+Clients may compress large prediction frames (see ServingClient's
+compress_min_bytes). GzipRequestMiddleware inflates the body while the app
+reads it, so streamed uploads (/predict_stream) stay incremental, and
+bounds both the inflated size (a small body may inflate to gigabytes) and
+the memory of each read. Errors surface as 400 / 413 responses.
+"""
+
+from __future__ import annotations
+import io
+import zlib
+from typing import Any, BinaryIO, Callable, Iterable
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+
+class InflatingStream(io.RawIOBase):
+    """Read-only stream of the inflated content of a gzip stream."""
+
+    def __init__(self, raw: BinaryIO, max_bytes: int, chunk: int = 64 * 1024):
+        self.raw = raw
+        self.max_bytes = max_bytes
+        self.chunk = chunk
+        self.total = 0
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> None:
+        while not self._buf and not self._inflater.eof:
+            data = self._inflater.unconsumed_tail or self.raw.read(self.chunk)
+            if not data:
+                raise BadRequest("Truncated gzip body")
+            try:
+                # at most chunk * 16 inflated bytes per call
+                self._buf = self._inflater.decompress(data, self.chunk * 16)
+            except zlib.error as e:
+                raise BadRequest(f"Invalid gzip body: {e}")
+            self.total += len(self._buf)
+            if self.total > self.max_bytes:
+                raise RequestEntityTooLarge(f"Inflated body larger than {self.max_bytes} bytes")
+
+    def readinto(self, b: Any) -> int:
+        self._fill()
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def inflate(body: bytes, max_bytes: int) -> bytes:
+    """The inflated content of a whole gzip body. Raises BadRequest / RequestEntityTooLarge."""
+    return InflatingStream(io.BytesIO(body), max_bytes).readall()
+
+
+class GzipRequestMiddleware:
+    """WSGI middleware: serve requests with Content-Encoding: gzip as if they were sent uncompressed."""
+
+    def __init__(self, app: Callable, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        if environ.get("HTTP_CONTENT_ENCODING", "").strip().lower() == "gzip":
+            raw = environ["wsgi.input"]
+            length = environ.get("CONTENT_LENGTH")
+            if length and not environ.get("wsgi.input_terminated"):
+                raw = LimitedStream(raw, int(length))
+            environ["wsgi.input"] = io.BufferedReader(InflatingStream(raw, self.max_bytes))
+            # the inflated length is unknown: the app reads the body to its end
+            environ.pop("CONTENT_LENGTH", None)
+            environ.pop("HTTP_CONTENT_ENCODING")
+            environ["wsgi.input_terminated"] = True
+        return self.app(environ, start_response)
@@ -0,0 +1,228 @@
+"""
+Asynchronous bulk scoring jobs.
+
+A job scores a whole file (CSV or Parquet, e.g. the processed seasons
+2016-2023) without holding an HTTP connection open: submit() returns a job
+id right away and the job runs in the background. The input is read in
+shards of shard_rows rows; each shard is scored in a small process pool and
+its results are spooled to disk as one columnar frame (see columnar.py), so
+neither the input nor the results are ever fully in memory.
+
+Every job has a directory under `root` with its status.json (replaced
+atomically, see atomic_file.py) and its part-NNNNNN.xgc result files,
+so any gunicorn worker can answer status and result requests.
+
+At most max_running jobs run at once across all the workers of the host
+(each running job holds a flock()ed slot file), the others wait in
+"queued". Pool processes run at a lower CPU priority so interactive
+/predict requests keep their latency.
+"""
+
+from __future__ import annotations
+import fcntl
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import columnar
+from atomic_file import write_atomic
+from kernels import output_column
+from registry import ModelKey
+
+INPUT_FORMATS = (".csv", ".csv.gz", ".parquet")
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def score_shard(kernel: Any, X: np.ndarray, first_row: int, path: str, outputs: Sequence[str]) -> int:
+    """Runs in a pool process: score one shard and spool its results to path."""
+    p_goal, y_pred = kernel.score(X)
+    columns = {"row": np.arange(first_row, first_row + len(X))}
+    for name in outputs:
+        columns[name] = output_column(name, y_pred, p_goal)
+    write_atomic(path, columnar.encode_columns(columns))
+    return len(X)
+
+
+def _lower_priority(niceness: int) -> None:
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+def iter_shards(path: str, columns: Sequence[str], shard_rows: int) -> Iterator[pd.DataFrame]:
+    """Read only `columns` of a CSV or Parquet file, shard_rows rows at a time."""
+    columns = list(columns)
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            # without pyarrow the file is read at once (pandas may still have fastparquet)
+            df = pd.read_parquet(path, columns=columns)
+            for start in range(0, len(df), shard_rows):
+                yield df.iloc[start:start + shard_rows]
+            return
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=shard_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(path, usecols=columns, chunksize=shard_rows)
+
+
+class JobManager:
+    """
+    resolve(key) returns the registry entry (kernel + feature plan) of the
+    model a job scores with, loading it if needed.
+    """
+
+    def __init__(self, root: str, input_root: str, resolve: Callable[[ModelKey], Any],
+                 max_running: int = 1, processes: int = 2, shard_rows: int = 100000,
+                 niceness: int = 10, poll: float = 1.0):
+        self.root = root
+        self.input_root = os.path.realpath(input_root)
+        self.resolve = resolve
+        self.max_running = max_running
+        self.processes = processes
+        self.shard_rows = shard_rows
+        self.niceness = niceness
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._threads = None
+        self._processes = None
+        self._pid = None
+        os.makedirs(root, exist_ok=True)
+
+    def _pools(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._threads = ThreadPoolExecutor(8, thread_name_prefix="bulk-job")
+                # spawn: forking a process that already runs threads is not safe
+                self._processes = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_lower_priority, initargs=(self.niceness,))
+            return self._threads, self._processes
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def resolve_input(self, path: str) -> str:
+        """Absolute path of an input file, which must be a CSV/Parquet file under input_root."""
+        full = os.path.realpath(os.path.join(self.input_root, path))
+        if os.path.commonpath([full, self.input_root]) != self.input_root:
+            raise ValueError(f"Input {path} is outside of the job input directory")
+        if not full.endswith(INPUT_FORMATS):
+            raise ValueError(f"Input {path} must be one of {list(INPUT_FORMATS)}")
+        if not os.path.isfile(full):
+            raise ValueError(f"Input {path} not found")
+        return full
+
+    def submit(self, input_path: str, key: ModelKey, outputs: Sequence[str]) -> Dict[str, Any]:
+        """Queue a job; returns its status (with its id). Raises ValueError for a bad input."""
+        full = self.resolve_input(input_path)
+        workspace, project, model, version = key
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        status = {
+            "job_id": job_id,
+            "state": "queued",
+            "input": input_path,
+            "workspace": workspace,
+            "project": project,
+            "model": model,
+            "version": version,
+            "outputs": list(outputs),
+            "rows_done": 0,
+            "parts": 0,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "error": None,
+        }
+        self._write_status(status)
+        threads, _ = self._pools()
+        threads.submit(self._run, status, full)
+        return status
+
+    def _write_status(self, status: Dict[str, Any]) -> None:
+        write_atomic(os.path.join(self.job_dir(status["job_id"]), "status.json"), json.dumps(status).encode())
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.job_dir(job_id), "status.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recently submitted jobs first."""
+        statuses = [self.status(name) for name in os.listdir(self.root)]
+        statuses = [s for s in statuses if s is not None]
+        statuses.sort(key=lambda s: s["submitted"], reverse=True)
+        return statuses[:limit]
+
+    def parts(self, job_id: str) -> List[str]:
+        """Result files of a job, in input order."""
+        folder = self.job_dir(job_id)
+        names = sorted(n for n in os.listdir(folder) if n.startswith("part-") and n.endswith(".xgc"))
+        return [os.path.join(folder, n) for n in names]
+
+    def _acquire_slot(self):
+        while True:
+            for i in range(self.max_running):
+                f = open(os.path.join(self.root, f".slot-{i}.lock"), "w")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except OSError:
+                    f.close()
+            time.sleep(self.poll)
+
+    def _run(self, status: Dict[str, Any], path: str) -> None:
+        slot = self._acquire_slot()
+        try:
+            status.update(state="running", started=time.time())
+            self._write_status(status)
+
+            key = (status["workspace"], status["project"], status["model"], status["version"])
+            entry = self.resolve(key)
+            if entry.features is None:
+                raise ValueError(f"No feature list known for model {entry.name}")
+
+            _, pool = self._pools()
+            folder = self.job_dir(status["job_id"])
+            # enough shards in flight to keep the pool busy, few enough to bound memory
+            pending = deque()
+            first_row = 0
+            for i, shard in enumerate(iter_shards(path, entry.features, self.shard_rows)):
+                X = shard[entry.features].to_numpy(dtype=float)
+                part = os.path.join(folder, f"part-{i:06d}.xgc")
+                pending.append(pool.submit(score_shard, entry.kernel, X, first_row, part, status["outputs"]))
+                first_row += len(X)
+                while len(pending) >= 2 * self.processes:
+                    self._shard_done(status, pending.popleft().result())
+            while pending:
+                self._shard_done(status, pending.popleft().result())
+
+            status.update(state="done", finished=time.time())
+        except Exception as e:
+            status.update(state="failed", finished=time.time(), error=str(e))
+        finally:
+            slot.close()
+        self._write_status(status)
+
+    def _shard_done(self, status: Dict[str, Any], rows: int) -> None:
+        status["rows_done"] += rows
+        status["parts"] += 1
+        self._write_status(status)
@@ -0,0 +1,187 @@
+"""
+Inference kernels.
+
+Every loaded model gets a kernel with a single entry point,
+score(X) -> (proba_goal, prediction), so the goal probability is computed
+once and the class is derived from it instead of running predict_proba and
+predict separately.
+
+LinearKernel handles the binary logistic regressions we serve (optionally
+behind a SimpleImputer / StandardScaler in a Pipeline): the coefficients are
+extracted once at load time into contiguous float32 arrays and scoring is one
+mat-vec plus a sigmoid, without sklearn's per-call input validation.
+Any other model goes through SklearnKernel. The same parameters can be
+exported to a portable artifact and loaded back without sklearn (see
+portable.py).
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+OUTPUTS = ("prediction", "proba_non_goal", "proba_goal")
+
+
+def _is_nan(value: Any) -> bool:
+    return isinstance(value, float) and np.isnan(value)
+
+
+def linear_params(model: Any) -> Optional[Dict[str, Any]]:
+    """
+    Parameters of a fitted binary logistic regression (optionally behind a
+    SimpleImputer / StandardScaler), in float64, with the scaler folded into
+    the weights: {coef, intercept, classes, fill}. None if the model is not
+    such a linear model.
+    """
+    steps = [s for _, s in model.steps] if hasattr(model, "steps") else [model]
+    *pre, clf = steps
+
+    fill = None
+    mean = scale = None
+    for step in pre:
+        kind = type(step).__name__
+        if kind == "SimpleImputer" and mean is None:
+            stats = np.asarray(getattr(step, "statistics_", []), dtype=float)
+            if (getattr(step, "add_indicator", False) or not _is_nan(step.missing_values)
+                    or np.isnan(stats).any()):
+                return None
+            fill = stats
+        elif kind == "StandardScaler" and mean is None:
+            mean = step.mean_ if step.mean_ is not None else 0.0
+            scale = step.scale_ if step.scale_ is not None else 1.0
+        else:
+            return None
+
+    if type(clf).__name__ != "LogisticRegression":
+        return None
+    classes = getattr(clf, "classes_", None)
+    coef = getattr(clf, "coef_", None)
+    if classes is None or len(classes) != 2 or coef is None or coef.shape[0] != 1:
+        return None
+
+    coef = np.asarray(coef[0], dtype=float)
+    intercept = float(clf.intercept_[0])
+    if mean is not None:
+        # fold the scaler into the weights: w.(x - m)/s + b = (w/s).x + (b - w.m/s)
+        coef = coef / scale
+        intercept = intercept - float(np.sum(coef * mean))
+    return {"coef": coef, "intercept": intercept, "classes": np.asarray(classes), "fill": fill}
+
+
+class LinearKernel:
+
+    def __init__(self, coef: np.ndarray, intercept: float, classes: np.ndarray,
+                 fill: Optional[np.ndarray] = None, threshold: float = 0.5):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float32).reshape(-1)
+        self.intercept = np.float32(intercept)
+        self.classes = np.asarray(classes)
+        self.fill = None if fill is None else np.ascontiguousarray(fill, dtype=np.float32)
+        # proba_goal > threshold  <=>  z > logit(threshold)
+        self.threshold = threshold
+        self.z_threshold = np.float32(np.log(threshold / (1.0 - threshold)))
+
+    @classmethod
+    def from_model(cls, model: Any) -> Optional["LinearKernel"]:
+        """Extract a kernel from a fitted model, or None if it is not a supported linear model."""
+        params = linear_params(model)
+        return cls(**params) if params is not None else None
+
+    def score(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if self.fill is not None:
+            missing = np.isnan(X)
+            if missing.any():
+                X = np.where(missing, self.fill, X)
+        z = X @ self.coef + self.intercept
+        # numerically stable sigmoid
+        e = np.exp(-np.abs(z))
+        proba = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e)).astype(np.float32)
+        pred = self.classes[(z > self.z_threshold).astype(np.intp)]
+        return proba, pred
+
+
+class SklearnKernel:
+    """Fallback for models LinearKernel cannot express."""
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.classes = np.asarray(model.classes_)
+
+    def score(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # the classes come from predict(), not argmax(proba): estimators may use another threshold
+        return self.model.predict_proba(X)[:, 1], self.model.predict(X)
+
+
+class EnsembleKernel:
+    """
+    Several models scored in one pass over the union of their features.
+
+    The linear members are stacked into one (n_features, n_models) weight
+    matrix (zero where a model does not use a feature), so all their logits
+    are a single X @ W. Missing values are imputed per model with a second
+    product, mask @ (fill * W), since two models may fill the same feature
+    differently. Other members are scored one by one on their own columns.
+    """
+
+    def __init__(self, kernels: Sequence[Any], features: Sequence[Sequence[str]]):
+        self.kernels = list(kernels)
+        self.features = list(dict.fromkeys(f for fs in features for f in fs))
+        index = {f: i for i, f in enumerate(self.features)}
+        self.columns = [[index[f] for f in fs] for fs in features]
+
+        self.linear = [m for m, k in enumerate(self.kernels) if isinstance(k, LinearKernel)]
+        self.other = [m for m, k in enumerate(self.kernels) if not isinstance(k, LinearKernel)]
+        n_features = len(self.features)
+        W = np.zeros((n_features, len(self.linear)), dtype=np.float32)
+        F = np.zeros((n_features, len(self.linear)), dtype=np.float32)
+        # features a member needs but cannot impute: a missing value makes its output NaN
+        no_fill = np.zeros((n_features, len(self.linear)), dtype=bool)
+        for j, m in enumerate(self.linear):
+            kernel, cols = self.kernels[m], self.columns[m]
+            W[cols, j] = kernel.coef
+            if kernel.fill is not None:
+                F[cols, j] = kernel.fill * kernel.coef
+            else:
+                no_fill[cols, j] = True
+        self.W = W
+        self.fill_W = F
+        self.no_fill = no_fill.astype(np.float32)
+        self.b = np.array([self.kernels[m].intercept for m in self.linear], dtype=np.float32)
+        self.z_threshold = np.array([self.kernels[m].z_threshold for m in self.linear], dtype=np.float32)
+
+    def score(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(proba_goal, prediction), each (n_rows, n_models) in the order of the kernels."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        proba = np.empty((len(X), len(self.kernels)), dtype=np.float32)
+        pred = np.empty((len(X), len(self.kernels)), dtype=np.int64)
+
+        if self.linear:
+            missing = np.isnan(X)
+            if missing.any():
+                mask = missing.astype(np.float32)
+                z = np.where(missing, 0.0, X) @ self.W + self.b + mask @ self.fill_W
+                z[(mask @ self.no_fill) > 0] = np.nan
+            else:
+                z = X @ self.W + self.b
+            e = np.exp(-np.abs(z))
+            proba[:, self.linear] = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e))
+            for j, m in enumerate(self.linear):
+                pred[:, m] = self.kernels[m].classes[(z[:, j] > self.z_threshold[j]).astype(np.intp)]
+
+        for m in self.other:
+            proba[:, m], pred[:, m] = self.kernels[m].score(X[:, self.columns[m]])
+        return proba, pred
+
+
+def output_column(name: str, pred: np.ndarray, proba_goal: np.ndarray) -> np.ndarray:
+    """One of OUTPUTS, from a kernel's score() results."""
+    if name == "prediction":
+        return pred
+    if name == "proba_goal":
+        return proba_goal
+    return 1.0 - proba_goal
+
+
+def make_kernel(model: Any):
+    return LinearKernel.from_model(model) or SklearnKernel(model)
@@ -0,0 +1,121 @@
+"""
+Background model loading.
+
+Downloading an artifact from W&B and unpickling it takes seconds, so it runs
+in a small thread pool instead of the request thread. Each (workspace,
+project, model, version) has at most one load in flight: concurrent requests
+for the same artifact share the same LoadJob. A job that asked for a swap
+makes the model the default only once it is fully loaded and warmed up, so
+/predict never sees a half-loaded model.
+"""
+
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from registry import ModelKey
+
+
+class LoadJob:
+
+    def __init__(self, key: ModelKey):
+        self.key = key
+        self.state = "queued"
+        self.make_default = False
+        self.submitted = time.time()
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+
+    def describe(self) -> Dict[str, Any]:
+        workspace, project, model, version = self.key
+        end = self.finished or time.time()
+        return {
+            "workspace": workspace,
+            "project": project,
+            "model": model,
+            "version": version,
+            "state": self.state,
+            "swap": self.make_default,
+            "submitted": self.submitted,
+            "elapsed_sec": end - self.submitted,
+            "error": self.error,
+        }
+
+
+class BackgroundLoader:
+    """
+    load_fn(key, report) loads a model and returns its registry entry, calling
+    report(stage) as it goes; on_swap(entry) makes it the default model.
+    """
+
+    def __init__(self, load_fn: Callable[[ModelKey, Callable[[str], None]], Any],
+                 on_swap: Callable[[Any], None], max_workers: int = 2, history: int = 20):
+        self.load_fn = load_fn
+        self.on_swap = on_swap
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._active: Dict[ModelKey, LoadJob] = {}
+        self._done: deque = deque(maxlen=history)
+        self._executor = None
+        self._pid = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="model-loader")
+        return self._executor
+
+    def submit(self, key: ModelKey, make_default: bool = False) -> LoadJob:
+        """Start loading key, or join the load already in flight for it."""
+        with self._lock:
+            job = self._active.get(key)
+            if job is None:
+                job = LoadJob(key)
+                self._active[key] = job
+                job.future = self._pool().submit(self._run, job)
+            job.make_default = job.make_default or make_default
+            return job
+
+    def _report(self, job: LoadJob) -> Callable[[str], None]:
+        def report(stage: str) -> None:
+            job.state = stage
+        return report
+
+    def _run(self, job: LoadJob) -> Any:
+        try:
+            entry = self.load_fn(job.key, self._report(job))
+        except Exception as e:
+            with self._lock:
+                job.state = "failed"
+                job.error = str(e)
+                self._finish(job)
+            raise
+
+        with self._lock:
+            try:
+                # checked under the lock so a swap requested while loading is not lost
+                if job.make_default:
+                    self.on_swap(entry)
+                job.state = "ready"
+            except Exception as e:
+                # e.g. the entry was evicted before the swap: fail the job rather than leave it active
+                job.state = "failed"
+                job.error = f"Swap failed: {e}"
+                raise
+            finally:
+                self._finish(job)
+        return entry
+
+    def _finish(self, job: LoadJob) -> None:
+        job.finished = time.time()
+        self._active.pop(job.key, None)
+        self._done.append(job)
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [j.describe() for j in self._active.values()] + [j.describe() for j in reversed(self._done)]
@@ -0,0 +1,104 @@
+"""
+Non-blocking logging for the serving app.
+
+Request threads only format the record and put it on a bounded queue
+(records are dropped, and counted, if the queue is full rather than making
+a request wait on the disk). A QueueListener thread writes them to the log
+file and to an in-memory ring buffer that /logs reads, so serving the tail
+does not re-read the whole file. Messages longer than max_chars are cut.
+"""
+
+from __future__ import annotations
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import deque
+from typing import List
+
+
+class RingBufferHandler(logging.Handler):
+    """Keep the last `capacity` formatted log lines in memory."""
+
+    def __init__(self, capacity: int = 1000):
+        super().__init__()
+        self.lines: deque = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def tail(self, n: int) -> List[str]:
+        lines = list(self.lines)
+        return lines[-n:] if n > 0 else []
+
+
+class BufferedQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, q: queue.Queue, listener_factory, max_chars: int):
+        super().__init__(q)
+        self.listener_factory = listener_factory
+        self.max_chars = max_chars
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._listener = self.listener_factory()
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        if self.max_chars and len(record.msg) > self.max_chars:
+            cut = len(record.msg) - self.max_chars
+            record.msg = f"{record.msg[:self.max_chars]}... [{cut} chars truncated]"
+            record.message = record.msg
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+def setup_logging(log_file: str, fmt: str, level: int = logging.INFO, capacity: int = 1000,
+                  max_chars: int = 2000, queue_size: int = 10000) -> RingBufferHandler:
+    """Route the root logger through the queue; returns the ring buffer behind /logs."""
+    # records reach these handlers already formatted by the queue handler
+    file_handler = logging.FileHandler(log_file, mode="a")
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    ring = RingBufferHandler(capacity)
+    ring.setFormatter(logging.Formatter("%(message)s"))
+
+    q = queue.Queue(maxsize=queue_size)
+
+    def listener_factory():
+        return logging.handlers.QueueListener(q, file_handler, ring, respect_handler_level=True)
+
+    handler = BufferedQueueHandler(q, listener_factory, max_chars)
+    handler.setFormatter(logging.Formatter(fmt))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for h in list(root.handlers):
+        if isinstance(h, BufferedQueueHandler):
+            h.stop()
+            root.removeHandler(h)
+    root.addHandler(handler)
+    return ring
@@ -0,0 +1,264 @@
+"""
+Minimal Prometheus-style metrics for the serving app (no client library).
+
+Counters and histograms are updated in the worker process and rendered in
+the Prometheus text exposition format by /metrics. StageTimer measures the
+stages of a single request; the durations feed a per-stage histogram and
+the Server-Timing response header.
+
+gunicorn runs several workers behind one port and a scrape reaches any one
+of them, so with a `directory` (SERVING_METRICS_DIR, set up by
+gunicorn.conf.py) every worker writes a snapshot of its counters and
+histograms to <directory>/<pid>-<start>.json every `interval` seconds and
+on each scrape, and /metrics renders the sum over all the snapshots. The
+snapshots of exited workers are kept, so totals never go down and rate()
+works. Gauges are read from the worker that answers the scrape.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from atomic_file import write_atomic
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), on_update: Callable[[], None] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.on_update = on_update
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if self.on_update is not None:
+            self.on_update()
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def reset(self) -> None:
+        # only called in a freshly forked child: the parent's lock may have been held at fork
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self, others: Sequence[List[Any]] = ()) -> List[str]:
+        """The series of this process, plus the snapshots of the other workers."""
+        with self._lock:
+            values = dict(self._values)
+        for snapshot in others:
+            for key, value in snapshot:
+                key = tuple(key)
+                values[key] = values.get(key, 0.0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """A value read from `fn` at scrape time."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self, others: Sequence[List[Any]] = ()) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_number(self.fn())}"]
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = (), on_update: Callable[[], None] = None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self.on_update = on_update
+        # per label set: [count per bucket..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        if self.on_update is not None:
+            self.on_update()
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), list(counts), total[0]] for key, (counts, total) in self._series.items()]
+
+    def reset(self) -> None:
+        # only called in a freshly forked child: the parent's lock may have been held at fork
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def render(self, others: Sequence[List[Any]] = ()) -> List[str]:
+        """The series of this process, plus the snapshots of the other workers."""
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        for snapshot in others:
+            for key, counts, total in snapshot:
+                key = tuple(key)
+                if len(counts) != len(self.buckets) + 1:
+                    continue  # written with other buckets (older code)
+                mine, mine_total = series.get(key, ([0] * len(counts), 0.0))
+                series[key] = ([a + b for a, b in zip(mine, counts)], mine_total + total)
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self, directory: Optional[str] = None, interval: float = 5.0):
+        self.directory = directory
+        self.interval = interval
+        self._metrics = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _ensure_writer(self) -> None:
+        if self.directory is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    # forked: the inherited values are in the parent's snapshot (see flush)
+                    for metric in self._metrics:
+                        if hasattr(metric, "reset"):
+                            metric.reset()
+                # a file per process start: a reused pid does not overwrite the totals of a dead worker
+                self._file = os.path.join(self.directory, f"{os.getpid()}-{time.time_ns()}.json")
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="metrics-writer", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the snapshot of this process now (gunicorn calls it in the master before each fork)."""
+        if self.directory is None:
+            return
+        self._ensure_writer()
+        snapshot = {m.name: m.snapshot() for m in self._metrics if hasattr(m, "snapshot")}
+        try:
+            write_atomic(self._file, json.dumps(snapshot).encode())
+        except OSError:
+            pass  # the next write retries; the scrape still has this worker's live values
+
+    def _others(self) -> List[Dict[str, Any]]:
+        """Snapshots of the other workers (running or exited)."""
+        snapshots = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not name.endswith(".json") or path == self._file:
+                continue
+            try:
+                with open(path, "r") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames, self._ensure_writer)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        metric = Gauge(name, help, fn)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> Histogram:
+        metric = Histogram(name, help, buckets, labelnames, self._ensure_writer)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        others = []
+        if self.directory is not None:
+            self.flush()
+            others = self._others()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render([o[metric.name] for o in others if metric.name in o]))
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Durations of the named stages of one request, in order."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        return ", ".join(f"{name};dur={seconds * 1000.0:.3f}" for name, seconds in self.stages)
@@ -0,0 +1,66 @@
+"""
+Default model shared by every gunicorn worker.
+
+Each worker is a separate process with its own registry, so a swap handled
+by one worker has to be published for the others. The current default model
+key is kept in a small JSON file next to the artifacts; it is replaced
+atomically (see atomic_file.py) and every worker re-reads it
+when its mtime changes, checking at most every `interval` seconds.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from atomic_file import write_atomic
+from registry import ModelKey
+
+
+class ModelPointer:
+
+    def __init__(self, path: str, interval: float = 0.5):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._stamp = None
+
+    def publish(self, key: ModelKey) -> None:
+        workspace, project, model, version = key
+        payload = {
+            "workspace": workspace,
+            "project": project,
+            "model": model,
+            "version": version,
+            "published": time.time(),
+            "pid": os.getpid(),
+        }
+        write_atomic(self.path, json.dumps(payload).encode())
+
+    def read(self) -> Optional[ModelKey]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return (data["workspace"], data["project"], data["model"], data["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def changed(self) -> Optional[ModelKey]:
+        """The published key if the file changed since the last call, else None (cheap: a stat)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return None
+            self._next_check = now + self.interval
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return None
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if stamp == self._stamp:
+                return None
+            self._stamp = stamp
+        return self.read()
@@ -0,0 +1,116 @@
+"""
+Portable coefficient-only artifacts for linear models.
+
+A joblib artifact needs the whole sklearn stack (and a matching sklearn
+version) to unpickle what is, for our logistic regressions, a handful of
+floats. A `<model>.linear.json` next to it holds the same model as plain
+JSON: the feature names, the coefficients and intercept (scaler folded in),
+the imputer fill values, the classes and the decision threshold, plus a
+hash of that content. The serving app loads it with NumPy only (see
+load_model in app.py); models that LinearKernel cannot express keep using
+the joblib artifact.
+
+Export one from a joblib artifact (needs sklearn), e.g. from ./serving:
+
+    $ python portable.py ../artifacts/lr-distance:v1/lr-distance.joblib
+"""
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kernels import LinearKernel, linear_params
+
+FORMAT = "xg-linear/1"
+SUFFIX = ".linear.json"
+
+
+def artifact_path(artifact_dir: str, model_name: str, version: str) -> str:
+    return f"{artifact_dir}/{model_name}:{version}/{model_name}{SUFFIX}"
+
+
+def content_hash(payload: Dict[str, Any]) -> str:
+    """sha256 of the artifact content (everything but the hash itself), in canonical JSON."""
+    content = {k: v for k, v in payload.items() if k != "hash"}
+    raw = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def export_linear(model: Any, features: List[str], model_name: str, version: str,
+                  threshold: float = 0.5) -> Dict[str, Any]:
+    """The portable artifact of a fitted model. Raises ValueError if it is not a supported linear model."""
+    params = linear_params(model)
+    if params is None:
+        raise ValueError(f"{type(model).__name__} cannot be exported as a linear artifact")
+    if len(features) != len(params["coef"]):
+        raise ValueError(f"{len(features)} feature names for {len(params['coef'])} coefficients")
+    if not 0.0 < threshold < 1.0:
+        raise ValueError(f"threshold must be in (0, 1), got {threshold}")
+
+    payload = {
+        "format": FORMAT,
+        "model": model_name,
+        "version": version,
+        "features": list(features),
+        "coef": params["coef"].tolist(),
+        "intercept": params["intercept"],
+        "fill": None if params["fill"] is None else params["fill"].tolist(),
+        "classes": params["classes"].tolist(),
+        "threshold": threshold,
+    }
+    payload["hash"] = content_hash(payload)
+    return payload
+
+
+def load_linear(path: str) -> Tuple[LinearKernel, List[str], Dict[str, Any]]:
+    """(kernel, features, artifact) from a portable artifact. Raises ValueError if it is invalid."""
+    with open(path, "r") as f:
+        payload = json.load(f)
+    if payload.get("format") != FORMAT:
+        raise ValueError(f"{path}: unknown format {payload.get('format')!r}, expected {FORMAT!r}")
+    if payload.get("hash") != content_hash(payload):
+        raise ValueError(f"{path}: content does not match its hash")
+
+    kernel = LinearKernel(
+        np.asarray(payload["coef"], dtype=float),
+        payload["intercept"],
+        np.asarray(payload["classes"]),
+        None if payload["fill"] is None else np.asarray(payload["fill"], dtype=float),
+        payload["threshold"],
+    )
+    return kernel, list(payload["features"]), payload
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export a joblib linear model to the portable format.")
+    parser.add_argument("joblib_path", help="e.g. ../artifacts/lr-distance:v1/lr-distance.joblib")
+    parser.add_argument("--features", nargs="+", help="input columns, in order (default: from the model)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="decision threshold on proba_goal")
+    parser.add_argument("--output", help=f"default: <model>{SUFFIX} next to the joblib file")
+    args = parser.parse_args(argv)
+
+    import joblib
+    from registry import feature_plan
+
+    # artifacts live in <model>:<version>/<model>.joblib
+    folder = os.path.dirname(os.path.abspath(args.joblib_path))
+    model_name, _, version = os.path.basename(folder).partition(":")
+    model = joblib.load(args.joblib_path)
+    features = args.features or feature_plan(model, model_name)
+    if not features:
+        parser.error(f"no feature list known for {model_name}, pass --features")
+
+    payload = export_linear(model, features, model_name, version, args.threshold)
+    output = args.output or os.path.join(folder, f"{model_name}{SUFFIX}")
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Wrote {output} ({payload['hash'][:12]})")
+
+
+if __name__ == "__main__":
+    main()
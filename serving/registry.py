@@ -0,0 +1,155 @@
+"""
+In-memory registry of loaded models.
+
+Several models stay resident at once, keyed by (workspace, project, model,
+version), so /predict can pick one per request (A/B dashboards). When the
+estimated memory of the resident models goes over the budget, the least
+recently used ones are evicted; the default model (the one /predict uses
+when the request names none) is never evicted.
+"""
+
+from __future__ import annotations
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+ModelKey = Tuple[str, str, str, str]
+
+# input columns of each model, in the order the model was trained on.
+# Used when the artifact does not carry feature_names_in_ itself.
+MODEL_FEATURES = {
+    "lr-distance": ["distance_from_net"],
+    "lr-angle": ["shot_angle"],
+    "lr-both": ["distance_from_net", "shot_angle"],
+}
+
+
+def feature_plan(model: Any, model_name: str) -> Optional[List[str]]:
+    """Columns to stack, in order, to build the model's input matrix."""
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return [str(n) for n in names]
+    return MODEL_FEATURES.get(model_name)
+
+
+def estimate_nbytes(*objects: Any) -> int:
+    total = 0
+    for obj in objects:
+        if obj is None:
+            continue
+        try:
+            total += len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            pass
+    return total
+
+
+class LoadedModel:
+    """A resident model with everything precomputed to serve it."""
+
+    def __init__(self, key: ModelKey, model: Any, kernel: Any, features: Optional[List[str]], grid: Any = None):
+        self.key = key
+        self.model = model
+        self.kernel = kernel
+        self.features = features
+        self.grid = grid
+        self.nbytes = estimate_nbytes(model, kernel, grid)
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.n_requests = 0
+
+    @property
+    def name(self) -> str:
+        return self.key[2]
+
+    @property
+    def version(self) -> str:
+        return self.key[3]
+
+    def describe(self) -> Dict[str, Any]:
+        workspace, project, model, version = self.key
+        return {
+            "workspace": workspace,
+            "project": project,
+            "model": model,
+            "version": version,
+            "features": self.features,
+            "kernel": type(self.kernel).__name__,
+            # portable: loaded from a coefficient-only artifact (see portable.py)
+            "artifact": "joblib" if self.model is not None else "portable",
+            "grid_table": self.grid is not None,
+            "nbytes": self.nbytes,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "n_requests": self.n_requests,
+        }
+
+
+class ModelRegistry:
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[ModelKey, LoadedModel]" = OrderedDict()
+        self._default: Optional[ModelKey] = None
+        self._lock = threading.RLock()
+
+    def get(self, key: ModelKey) -> Optional[LoadedModel]:
+        """Resident entry for key (marked as most recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = time.time()
+                entry.n_requests += 1
+            return entry
+
+    def put(self, entry: LoadedModel) -> List[ModelKey]:
+        """Add or replace an entry; returns the keys evicted to stay under budget."""
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            return self._evict(keep=entry.key)
+
+    def set_default(self, key: ModelKey) -> List[ModelKey]:
+        """Make key the default model; returns the keys evicted to stay under budget."""
+        with self._lock:
+            if key not in self._entries:
+                raise KeyError(f"Model {key} is not loaded")
+            self._default = key
+            return self._evict(keep=key)
+
+    def _evict(self, keep: ModelKey) -> List[ModelKey]:
+        # oldest first; the default model and `keep` always stay
+        evicted = []
+        for key in list(self._entries):
+            if self.total_nbytes() <= self.memory_budget_bytes:
+                break
+            if key in (keep, self._default):
+                continue
+            del self._entries[key]
+            evicted.append(key)
+        return evicted
+
+    @property
+    def default_key(self) -> Optional[ModelKey]:
+        return self._default
+
+    def default(self) -> Optional[LoadedModel]:
+        with self._lock:
+            return self._entries.get(self._default) if self._default else None
+
+    def total_nbytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            default = self.default()
+            return {
+                "default": default.describe() if default else None,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": self.total_nbytes(),
+                "models": [e.describe() for e in reversed(self._entries.values())],
+            }
@@ -1,7 +1,6 @@
 import os
 import streamlit as st
 import pandas as pd
-import requests
 
 from ift6758.ift6758.client.serving_client import ServingClient
 from scripts.step3_clients.live_game_events import poll_and_predict
@@ -34,7 +33,12 @@ if "meta" not in st.session_state:
 # CLIENT
 # ================================================
 # serving = ServingClient(ip="127.0.0.1", port=5000) # Local flask app
-serving = ServingClient(ip=SERVING_HOST, port=SERVING_PORT)
+@st.cache_resource
+def get_serving_client():
+    # one client (and connection pool) for every rerun and session of the app
+    return ServingClient(ip=SERVING_HOST, port=SERVING_PORT)
+
+serving = get_serving_client()
 
 st.title("Hockey Expected Goals Dashboard")
 
@@ -49,8 +53,11 @@ with st.sidebar:
     version = st.text_input("Version")
 
     if st.button("Download Model"):
-        serving.download_registry_model(workspace, model, version)
-        st.success("Model downloaded!")
+        res = serving.download_registry_model(workspace, model, version)
+        if "error" in res:
+            st.error(res["error"])
+        else:
+            st.success(res.get("info", "Model swap started"))
 
 
 # ================================================
@@ -68,38 +75,21 @@ st.subheader("Game info / xG Summary")
 
 if ping and game_id:
 
-    df_output, num = poll_and_predict(int(game_id))
+    # one feed download serves the new events and the scoreboard
+    df_output, num, meta = poll_and_predict(int(game_id))
     if df_output is None or num == 0:
         st.info("No new events.")
     else:
         st.session_state.df = pd.concat([st.session_state.df, df_output], ignore_index=True)
 
-    # Metadata 
-    meta_url = f"https://api-web.nhle.com/v1/gamecenter/{game_id}/play-by-play"
-    meta = requests.get(meta_url).json()
-
-    # Team names
-    home = meta["homeTeam"]["commonName"]["default"]
-    away = meta["awayTeam"]["commonName"]["default"]
-    st.session_state.teams = {"home": home, "away": away}
-
-    # Logos
-    st.session_state.logos = {
-        "home": meta["homeTeam"]["logo"],
-        "away": meta["awayTeam"]["logo"]
-    }
-
-    # Score
-    st.session_state.score = {
-        "home": meta["homeTeam"]["score"],
-        "away": meta["awayTeam"]["score"],
-    }
-
-    # Time / Period
-    st.session_state.meta = {
-        "period": meta["periodDescriptor"]["number"],
-        "time_left": meta["clock"]["timeRemaining"],
-    }
+    if meta is not None:
+        st.session_state.teams = meta["teams"]
+        st.session_state.logos = meta["logos"]
+        st.session_state.score = meta["score"]
+        st.session_state.meta = {"period": meta["period"], "time_left": meta["time_left"]}
+
+    home = st.session_state.teams["home"]
+    away = st.session_state.teams["away"]
 
     df = st.session_state.df
 